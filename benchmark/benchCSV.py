@@ -0,0 +1,77 @@
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+import time
+
+# csv output benchmark: the streaming CSVWriter against the old
+# DataFrame-per-call to_csv path, for 1-row and 1000-row batches
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from util.CSVWriter import CSVWriter
+
+
+def makeRow(i):
+    # shaped like a circle record from the event listing
+    return {"id": i,
+            "name": f"circle{i}",
+            "eventId": 9001,
+            "dataId": 1,
+            "isFollow": False,
+            "circleMemberList": [{"userId": i * 3 + k, "nickname": f"user{k}"} for k in range(3)],
+            "introduce": None}
+
+
+def pandasWrite(path, batches):
+    import pandas as pd
+    first = True
+    for batch in batches:
+        pd.DataFrame(batch).to_csv(path, index=False, mode='w' if first else 'a',
+                                   encoding='utf-8', header=first)
+        first = False
+
+
+def streamingWrite(path, batches):
+    writer = CSVWriter(path)
+    for batch in batches:
+        writer.writeRows(batch)
+    writer.close()
+
+
+def timeWriter(write, batches, baseDir):
+    path = os.path.join(baseDir, f"{write.__name__}.csv")
+    start = time.perf_counter()
+    write(path, batches)
+    return round(time.perf_counter() - start, 4)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="csv writer benchmark")
+    parser.add_argument("--rows", type=int, default=20000, help="rows written per run")
+    args = parser.parse_args()
+
+    # the pandas path is only timed where pandas is installed
+    writers = [streamingWrite]
+    if importlib.util.find_spec("pandas") is not None:
+        writers.insert(0, pandasWrite)
+
+    rows = [makeRow(i) for i in range(args.rows)]
+    results = []
+    with tempfile.TemporaryDirectory(prefix="cppcsv_") as baseDir:
+        for batchSize in [1, 1000]:
+            batches = [rows[i:i + batchSize] for i in range(0, len(rows), batchSize)]
+            for write in writers:
+                seconds = timeWriter(write, batches, baseDir)
+                results.append({"writer": write.__name__,
+                                "batchSize": batchSize,
+                                "seconds": seconds,
+                                "rowsPerSecond": round(len(rows) / seconds) if seconds else None})
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
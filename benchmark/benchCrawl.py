@@ -0,0 +1,103 @@
+from mockServer import MockDataset, startServer, requestCount
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# end-to-end benchmark: runs main.py's full pipeline against the mock server
+# in an isolated base dir and reports requests/s, wall time and peak RSS
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from util.KVDatabase import KVDatabase
+
+
+def prepareBaseDir(baseDir):
+    # config and cookies that let main.py start without an interactive login
+    cookiePath = os.path.join(baseDir, "cookies.json")
+    KVDatabase(os.path.join(baseDir, "config.json")).insert("cookie_path", cookiePath)
+    cookies = KVDatabase(cookiePath)
+    cookies.insert("cookie", {"JSESSIONID": "benchmark"})
+    cookies.insert("phone", "00000000000")
+    cookies.insert("password", "benchmark")
+
+
+def peakChildRSS():
+    # peak resident set size of finished children in MB, None if unsupported
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # linux reports KB, macOS bytes
+    return maxrss / (1024 * 1024) if sys.platform == "darwin" else maxrss / 1024
+
+
+def runCrawl(args):
+    dataset = MockDataset(args.eventId, args.circles, args.products, args.users, args.dataIds, args.maxPageSize)
+    server = startServer(dataset, latency=args.latency, errorRate=args.errorRate)
+    apiHost = f"http://127.0.0.1:{server.server_address[1]}"
+    with tempfile.TemporaryDirectory(prefix="cppbench_") as baseDir:
+        prepareBaseDir(baseDir)
+        env = dict(os.environ, CPP_BASE_DIR=baseDir, CPP_API_HOST=apiHost)
+        command = [sys.executable, os.path.join(REPO_DIR, "main.py"),
+                   "--page", f"https://www.allcpp.cn/allcpp/event/event.do?event={args.eventId}",
+                   "--force", "True",
+                   "--maxRatePerMinute", str(args.maxRatePerMinute),
+                   "--retryInterval", "1"] + args.mainArgs
+        start = time.perf_counter()
+        completed = subprocess.run(command, cwd=baseDir, env=env,
+                                   stdout=subprocess.DEVNULL, stderr=None if args.verbose else subprocess.DEVNULL)
+        wallTime = time.perf_counter() - start
+    server.shutdown()
+    requests = requestCount(server)
+    return {
+        "returncode": completed.returncode,
+        "circles": args.circles,
+        "products": args.products,
+        "users": args.users,
+        "requests": requests,
+        "wallTime": round(wallTime, 3),
+        "requestsPerSecond": round(requests / wallTime, 2) if wallTime > 0 else None,
+        "peakRSSMB": round(peakChildRSS(), 1) if peakChildRSS() is not None else None,
+        "mainArgs": args.mainArgs,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="crawl benchmark against the mock allcpp server")
+    parser.add_argument("--eventId", type=int, default=9001)
+    parser.add_argument("--circles", type=int, default=50)
+    parser.add_argument("--products", type=int, default=200)
+    parser.add_argument("--users", type=int, default=80)
+    parser.add_argument("--dataIds", type=int, default=1)
+    parser.add_argument("--maxPageSize", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds added to every mock response")
+    parser.add_argument("--errorRate", type=float, default=0.0, help="fraction of mock responses that are 503")
+    parser.add_argument("--maxRatePerMinute", type=int, default=0, help="passed to main.py, 0 for unlimited")
+    parser.add_argument("--output", type=str, default="", help="append the result as a json line to this file")
+    parser.add_argument("--verbose", action="store_true", help="show main.py's log output")
+    parser.add_argument("mainArgs", nargs=argparse.REMAINDER, help="extra arguments for main.py after --")
+    args = parser.parse_args()
+    if args.mainArgs and args.mainArgs[0] == "--":
+        args.mainArgs = args.mainArgs[1:]
+
+    result = runCrawl(args)
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, "a", encoding="utf-8") as f:
+            f.write(json.dumps(result) + "\n")
+    if result["returncode"] != 0:
+        sys.exit(result["returncode"])
+
+
+if __name__ == "__main__":
+    main()
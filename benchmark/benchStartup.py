@@ -0,0 +1,80 @@
+from mockServer import MockDataset, startServer
+from benchCrawl import REPO_DIR, prepareBaseDir
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+# startup benchmark: import time of every entry point (python -X importtime)
+# and time-to-first-request of main.py against the mock server
+
+ENTRY_POINTS = ["main", "traverseEvent", "traverseUser", "config"]
+
+
+def importTime(module, top=5):
+    # wall time of a bare import plus the slowest imports by cumulative time
+    start = time.perf_counter()
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                               cwd=REPO_DIR, capture_output=True, text=True)
+    wallTime = time.perf_counter() - start
+    imports = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # nested imports are indented, their time is in the parent's cumulative
+        if not name[1:].startswith(" "):
+            imports.append((int(cumulative) / 1e6, name.strip()))
+    imports = sorted(imports, reverse=True)[:top]
+    return {
+        "module": module,
+        "ok": completed.returncode == 0,
+        "wallTime": round(wallTime, 3),
+        "slowestImports": [{"name": name, "seconds": round(seconds, 3)} for seconds, name in imports],
+    }
+
+
+def timeToFirstRequest(timeout=30):
+    # seconds from launching main.py until the mock server sees its first request
+    server = startServer(MockDataset())
+    apiHost = f"http://127.0.0.1:{server.server_address[1]}"
+    handler = server.RequestHandlerClass
+    with tempfile.TemporaryDirectory(prefix="cppstartup_") as baseDir:
+        prepareBaseDir(baseDir)
+        env = dict(os.environ, CPP_BASE_DIR=baseDir, CPP_API_HOST=apiHost)
+        start = time.monotonic()
+        process = subprocess.Popen([sys.executable, os.path.join(REPO_DIR, "main.py"),
+                                    "--page", "https://www.allcpp.cn/allcpp/event/event.do?event=9001",
+                                    "--force", "True"],
+                                   cwd=baseDir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        while handler.firstRequestAt is None and process.poll() is None and time.monotonic() - start < timeout:
+            time.sleep(0.005)
+        process.kill()
+        process.wait()
+    server.shutdown()
+    if handler.firstRequestAt is None:
+        return None
+    return round(handler.firstRequestAt - start, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="startup time benchmark")
+    parser.add_argument("--target", type=float, default=1.0, help="seconds allowed until main.py's first request")
+    args = parser.parse_args()
+
+    results = {"imports": [importTime(module) for module in ENTRY_POINTS],
+               "timeToFirstRequest": timeToFirstRequest(),
+               "target": args.target}
+    print(json.dumps(results, indent=2))
+    ttfr = results["timeToFirstRequest"]
+    if ttfr is None or ttfr > args.target:
+        print(f"time to first request {ttfr} exceeds target {args.target}s")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
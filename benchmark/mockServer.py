@@ -0,0 +1,206 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import argparse
+import json
+import random
+import re
+import threading
+import time
+
+# offline stand-in for the allcpp endpoints the crawlers use, serving
+# synthetic data of configurable size. run it directly or via benchCrawl.py
+
+
+class MockDataset:
+    def __init__(self, eventId=9001, circles=100, products=500, users=200, dataIds=1,
+                 maxPageSize=50, membersPerCircle=2, eventsPerEntity=3):
+        self.eventId = int(eventId)
+        self.circles = circles
+        self.products = products
+        self.users = users
+        self.dataIds = [self.eventId * 10 + i for i in range(dataIds)]
+        self.maxPageSize = maxPageSize
+        self.membersPerCircle = membersPerCircle
+        self.eventsPerEntity = eventsPerEntity
+
+    # ids are offsets so circles, products and users never collide
+    def circleId(self, i):
+        return 10000 + i
+
+    def productId(self, i):
+        return 500000 + i
+
+    def userId(self, i):
+        return 100000 + i
+
+    def circle(self, i):
+        members = [{"userId": self.userId((i * self.membersPerCircle + k) % self.users),
+                    "nickname": f"user{(i * self.membersPerCircle + k) % self.users}",
+                    "role": k}
+                   for k in range(self.membersPerCircle)]
+        return {"id": self.circleId(i), "name": f"circle{i}", "tags": f"tag{i % 7}",
+                "circleMemberList": members}
+
+    def product(self, i):
+        return {"doujinshiId": self.productId(i), "id": self.productId(i), "name": f"product{i}",
+                "circleId": self.circleId(i % self.circles), "userId": self.userId(i % self.users),
+                "tag": f"tag{i % 11}", "price": i % 100}
+
+    def event(self, k):
+        return {"id": self.eventId - k, "eventMainId": self.eventId - k, "name": f"event{k}",
+                "enterTime": 1700000000000 - k * 86400000}
+
+    def page(self, items, pageIndex, pageSize):
+        pageSize = min(int(pageSize), self.maxPageSize)
+        start = (int(pageIndex) - 1) * pageSize
+        return items[start:start + pageSize]
+
+    def circlesOf(self, dataId):
+        # circles and products are spread over the data ids round-robin
+        index = self.dataIds.index(int(dataId)) if int(dataId) in self.dataIds else -1
+        return [i for i in range(self.circles) if i % len(self.dataIds) == index]
+
+    def productsOf(self, dataId):
+        index = self.dataIds.index(int(dataId)) if int(dataId) in self.dataIds else -1
+        return [i for i in range(self.products) if i % len(self.dataIds) == index]
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    dataset = None
+    latency = 0.0
+    errorRate = 0.0
+    requestCount = 0
+    firstRequestAt = None
+    countLock = threading.Lock()
+
+    def log_message(self, format, *args):
+        return
+
+    def _send(self, status, body, contentType="application/json;charset=UTF-8"):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body, ensure_ascii=False)
+        body = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", contentType)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _ok(self, result):
+        self._send(200, {"isSuccess": True, "result": result})
+
+    def _params(self):
+        parsed = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            body = self.rfile.read(length).decode("utf-8")
+            if body.lstrip().startswith("{"):
+                params.update(json.loads(body))
+            else:
+                params.update({k: v[0] for k, v in parse_qs(body).items()})
+        return parsed.path, params
+
+    def do_GET(self):
+        self._handle()
+
+    def do_POST(self):
+        self._handle()
+
+    def _handle(self):
+        path, params = self._params()
+        cls = type(self)
+        if path == "/__stats":
+            return self._send(200, {"requests": cls.requestCount})
+        with cls.countLock:
+            cls.requestCount += 1
+            if cls.firstRequestAt is None:
+                cls.firstRequestAt = time.monotonic()
+        if self.latency > 0:
+            time.sleep(self.latency)
+        if self.errorRate > 0 and random.random() < self.errorRate:
+            return self._send(503, "Service Unavailable", "text/plain")
+
+        ds = self.dataset
+        if path.endswith("/allcpp/event/getevents.do"):
+            return self._ok([{"id": ds.eventId, "name": f"event{ds.eventId}", "dataId": d} for d in ds.dataIds])
+        if path.endswith("/allcpp/event/event.do"):
+            spans = "".join(f'<span data-id="{d}">day{d}</span>' for d in ds.dataIds)
+            return self._send(200, f"<html><body>{spans}</body></html>", "text/html;charset=UTF-8")
+        if path.endswith("/api/circle/getcirclelist.do"):
+            rows = ds.page(ds.circlesOf(params["eventid"]), params["pageindex"], params["pagesize"])
+            return self._ok([ds.circle(i) for i in rows])
+        if path.endswith("/allcpp/event/getDoujinshiList.do"):
+            rows = ds.page(ds.productsOf(params["eventid"]), params["pageindex"], params["pagesize"])
+            return self._ok({"list": [ds.product(i) for i in rows], "total": ds.products})
+        if path.endswith("/allcpp/djs/detail.do"):
+            i = int(params["doujinshiID"]) - ds.productId(0)
+            return self._ok(dict(ds.product(i), description="x" * 200))
+        if path.endswith("/allcpp/djs/joinedEvent.do"):
+            return self._ok([ds.event(k) for k in range(ds.eventsPerEntity)])
+        if path.endswith("/api/circle/getcircledetail.do"):
+            i = int(params["circleid"]) - ds.circleId(0)
+            return self._ok(ds.circle(i))
+        if path.endswith("/allcpp/circle/mainEvent.do"):
+            return self._ok([ds.event(k) for k in range(ds.eventsPerEntity)])
+        if path.endswith("/allcpp/circle/allBenZi.do"):
+            i = int(params["circle_id"]) - ds.circleId(0)
+            rows = ds.page([p for p in range(ds.products) if p % ds.circles == i], params["page"], params["pageSize"])
+            return self._ok({"rows": [ds.product(p) for p in rows], "total": len(rows)})
+        if path.endswith("/allcpp/circle/getCircleMannage.do"):
+            return self._ok({"joinCircleList": [{"userId": ds.userId(0), "nickname": "bench"}]})
+        m = re.search(r"/allcpp/loginregister/getUser/(\d+)\.do", path)
+        if m:
+            i = int(m.group(1)) - ds.userId(0)
+            return self._ok({"userMain": {"id": int(m.group(1)), "nickname": f"user{i}", "intro": "y" * 100},
+                             "circleList": [{"circleId": ds.circleId(c)} for c in range(ds.circles)
+                                            if i in [(c * ds.membersPerCircle + k) % ds.users for k in range(ds.membersPerCircle)]]})
+        if path.endswith("/allcpp/doujinshi/getAuthorDoujinshiList.do"):
+            i = int(params["userid"]) - ds.userId(0)
+            rows = ds.page([p for p in range(ds.products) if p % ds.users == i], params["pageindex"], params["pagesize"])
+            return self._ok({"list": [ds.product(p) for p in rows]})
+        if path.endswith("/allcpp/user/getUserEventList.do"):
+            rows = ds.page(list(range(ds.eventsPerEntity)), params["pageindex"], params["pagesize"])
+            return self._ok({"list": [ds.event(k) for k in rows]})
+        return self._send(404, "Not Found", "text/plain")
+
+
+def startServer(dataset, host="127.0.0.1", port=0, latency=0.0, errorRate=0.0):
+    # start in a daemon thread, returns the server; server.server_address has the port
+    handler = type("BoundMockHandler", (MockHandler,), {"dataset": dataset, "latency": latency, "errorRate": errorRate,
+                                                        "requestCount": 0, "firstRequestAt": None,
+                                                        "countLock": threading.Lock()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def requestCount(server):
+    return server.RequestHandlerClass.requestCount
+
+
+def main():
+    parser = argparse.ArgumentParser(description="offline allcpp api stand-in")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--eventId", type=int, default=9001)
+    parser.add_argument("--circles", type=int, default=100)
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--dataIds", type=int, default=1, help="sub-events (data-id spans) of the event")
+    parser.add_argument("--maxPageSize", type=int, default=50, help="cap on the page size the server returns")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--errorRate", type=float, default=0.0, help="fraction of requests answered with 503")
+    args = parser.parse_args()
+    dataset = MockDataset(args.eventId, args.circles, args.products, args.users, args.dataIds, args.maxPageSize)
+    server = startServer(dataset, port=args.port, latency=args.latency, errorRate=args.errorRate)
+    print(f"mock allcpp listening on http://127.0.0.1:{server.server_address[1]}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
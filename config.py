@@ -3,9 +3,8 @@ import sys
 
 import loguru
 
-from util.CppRequest import CppRequest
 from util.KVDatabase import KVDatabase
-from util.TimeService import TimeService
+from util.AppPath import getBaseDir
 
 
 # 创建通知器实例
@@ -29,15 +28,42 @@ def get_application_tmp_path():
 
 
 TEMP_PATH = get_application_tmp_path()
-BASE_DIR = os.path.dirname(os.path.realpath(sys.executable))
+BASE_DIR = getBaseDir()
 
 loguru.logger.info(f"设置路径, APP_PATH={APP_PATH} TEMP_PATH={TEMP_PATH} BASE_DIR={BASE_DIR}")
-configDB = KVDatabase(os.path.join(BASE_DIR, "config.json"))
-if not configDB.contains("cookie_path"):
-    configDB.insert("cookie_path", os.path.join(BASE_DIR, "cookies.json"))
-main_request = CppRequest(cookies_config_path=configDB.get("cookie_path"))
-global_cookieManager = main_request.cookieManager
+
+# main_request, global_cookieManager and time_service are created on first
+# access, importing this module does no network or config I/O
+_lazy = {}
+
+
+def get_main_request():
+    if "main_request" not in _lazy:
+        from util.CppRequest import CppRequest
+        configDB = KVDatabase(os.path.join(BASE_DIR, "config.json"))
+        if not configDB.contains("cookie_path"):
+            configDB.insert("cookie_path", os.path.join(BASE_DIR, "cookies.json"))
+        _lazy["main_request"] = CppRequest(cookies_config_path=configDB.get("cookie_path"))
+    return _lazy["main_request"]
+
 
 ## 时间
-time_service = TimeService()
-time_service.set_timeoffset(time_service.compute_timeoffset())
+def get_time_service():
+    # the NTP round trip happens here, not at import
+    if "time_service" not in _lazy:
+        from util.TimeService import TimeService
+        time_service = TimeService()
+        time_service.set_timeoffset(time_service.compute_timeoffset())
+        _lazy["time_service"] = time_service
+    return _lazy["time_service"]
+
+
+def __getattr__(name):
+    # keeps `from config import main_request` style access working
+    if name == "main_request":
+        return get_main_request()
+    if name == "global_cookieManager":
+        return get_main_request().cookieManager
+    if name == "time_service":
+        return get_time_service()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1 @@
+# puts the repository root on sys.path, so a plain `pytest` finds the crawler modules
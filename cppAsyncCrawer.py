@@ -0,0 +1,128 @@
+from loguru import logger
+from util import AllcppApi
+from util.error import CrawlError
+
+# async counterparts of the crawler classes. every function takes an
+# AsyncCppRequest and yields the same records as the threaded crawlers,
+# urls and record shapes come from util.AllcppApi. entity functions raise
+# CrawlError on a failed page, like the threaded crawlers
+
+
+async def _getResult(request, url, what, data=None, headers=None, method="GET"):
+    response = await request.request(method, url, data, headers)
+    return AllcppApi.getResult(response, what)
+
+
+async def getDataIds(request, eventID):
+    # sub-event ids from the event page, see cppEventCrawer
+    response = await request.get(AllcppApi.eventPageUrl(eventID))
+    data_ids = AllcppApi.parseDataIds(response.text) if response is not None else []
+    if len(data_ids) == 0:
+        logger.error("No data_ids found")
+    return data_ids
+
+
+async def _getListing(request, eventID, data_ids, api, form, what, limitation=-1):
+    # one event listing page by page, a failed page ends its sub-event
+    num = 0
+    headers = request.getHeaders()
+    headers["content-type"] = AllcppApi.FORM_CONTENT_TYPE
+    for data_id in data_ids:
+        pageIndex = 1
+        while True:
+            try:
+                result = await _getResult(request, api, f"{what} list of EventID{data_id}",
+                                          data=form(data_id, pageIndex), headers=headers, method="POST")
+            except CrawlError as e:
+                logger.error(str(e))
+                break
+            pageList = result["list"] if isinstance(result, dict) else result
+            if not pageList:
+                break
+            logger.debug(f"Getting Page {pageIndex}, {len(pageList)} {what}s from EventID{data_id}")
+            for entry in pageList:
+                yield AllcppApi.listedEntry(entry, eventID, data_id)
+                num += 1
+                if limitation != -1 and num >= limitation:
+                    return
+            pageIndex += 1
+        logger.info(f"Finished getting {num} {what}s from EventID{data_id}")
+
+
+def getEventCircles(request, eventID, data_ids, limitation=-1):
+    return _getListing(request, eventID, data_ids, AllcppApi.CIRCLE_LIST_API, AllcppApi.circleListForm,
+                       "circle", limitation)
+
+
+def getEventProducts(request, eventID, data_ids, limitation=-1):
+    return _getListing(request, eventID, data_ids, AllcppApi.PRODUCT_LIST_API, AllcppApi.productListForm,
+                       "product", limitation)
+
+
+async def getCircleInfo(request, circleID, myUID):
+    return await _getResult(request, AllcppApi.circleInfoUrl(circleID, myUID), f"circlePage of circleID{circleID}")
+
+
+async def getCircleSchedule(request, circleID):
+    events = await _getResult(request, AllcppApi.circleScheduleUrl(circleID),
+                              f"scheduledEventsApi of circleID{circleID}")
+    for event in events:
+        yield AllcppApi.circleEvent(circleID, event)
+
+
+async def getCircleProducts(request, circleID):
+    pageIndex = 1
+    while True:
+        result = await _getResult(request, AllcppApi.circleProductsUrl(circleID, pageIndex),
+                                  f"circleProductsApi of circleID{circleID}")
+        if not result["rows"]:
+            return
+        logger.debug(f"Getting Page {pageIndex}, {len(result['rows'])} products from CircleID{circleID}")
+        for product in result["rows"]:
+            product["circleId"] = circleID
+            yield product
+        pageIndex += 1
+
+
+async def getProductInfo(request, PID):
+    return await _getResult(request, AllcppApi.productInfoUrl(PID), f"infoApi of PID{PID}")
+
+
+async def getProductSchedule(request, PID):
+    for isnew in AllcppApi.PRODUCT_SCHEDULE_LISTS:
+        pageList = await _getResult(request, AllcppApi.productScheduleUrl(PID, isnew), f"scheduleApi of PID{PID}")
+        for event in pageList:
+            yield AllcppApi.productEvent(PID, isnew, event)
+
+
+async def getUserInfo(request, UID):
+    # same shape as cppUserCrawer.getInfo, None for invalid users
+    data = await _getResult(request, AllcppApi.userInfoUrl(UID), f"infoApi of UID{UID}")
+    if AllcppApi.isInvalidUser(data):
+        return None
+    return AllcppApi.userInfo(data)
+
+
+async def getUserProducts(request, UID):
+    pageIndex = 1
+    while True:
+        result = await _getResult(request, AllcppApi.userProductsUrl(UID, pageIndex), f"productsApi of UID{UID}")
+        if not result["list"]:
+            return
+        for product in result["list"]:
+            product["userId"] = UID
+            yield product
+        pageIndex += 1
+
+
+async def getUserSchedule(request, UID):
+    for isnew, iswannago in AllcppApi.USER_SCHEDULE_LISTS:
+        pageIndex = 1
+        while True:
+            result = await _getResult(request, AllcppApi.userScheduleUrl(UID, pageIndex, isnew, iswannago),
+                                      f"scheduleApi of UID{UID}")
+            if not result["list"]:
+                break
+            for event in result["list"]:
+                yield AllcppApi.userEvent(UID, isnew, iswannago, event)
+            pageIndex += 1
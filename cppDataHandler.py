@@ -1,18 +1,34 @@
 import json
-import pandas as pd
+import functools
+import numbers
+import itertools
 import sqlite3
 import os
 import sys
 from loguru import logger
-from tqdm import tqdm
 import threading
+import atexit
+from util.CSVWriter import CSVWriter
+from util.ParquetWriter import ParquetWriter
+from util.SQLiteWriter import SQLiteWriter
+from util.TableSchema import TableSchema
+from util.DataSink import DataSink
 
 
 class cppDataHandler:
-    def __init__(self, path="default", db_id='2231', force=False, commit_every=1000, append_db=True):
+    # every handler of the process, closed together at shutdown
+    _handlers = []
+    _handlersLock = threading.Lock()
+
+    def __init__(self, path="default", db_id='2231', force=False, commit_every=1000, append_db=True, parquet=False,
+                 normalize=None, keys=None, indexes=None, chunk_size=1000, resume=False):
         csvPath = path + ".csv"
+        parquetPath = path + ".parquet" if parquet else None
         dbPath = db_id + ".db"
-        if os.path.exists(csvPath):
+        if os.path.exists(csvPath) and resume:
+            # an interrupted run: keep what it wrote and append to it
+            logger.warning(f"CSV file {csvPath} already exists, resuming")
+        elif os.path.exists(csvPath):
             if force:
                 os.remove(csvPath)
                 #os.remove(dbPath)
@@ -20,141 +36,277 @@ class cppDataHandler:
             else:
                 logger.error(f"CSV file {csvPath} already exists")
                 exit(1)
+        if parquetPath and os.path.exists(parquetPath) and force and not resume:
+            os.remove(parquetPath)
 
         self.csvPath = csvPath
         self.dbPath = dbPath
-        self.csvFirstWrite = True
-        self.DBFirstWrite = True
+        self.csvWriter = None
+        # schema registry per table of this handler
+        self.schemas = {}
         self.lockCSV = threading.Lock()
         self.lockDB = threading.Lock()
         self.commit_every = commit_every
+        self.chunk_size = chunk_size
+        self.resume = resume
         self.append_db = append_db
+        self.parquetPath = parquetPath
+        self.tableName = os.path.splitext(os.path.basename(csvPath))[0]
+        # nested fields written to child tables instead of json text in the db,
+        # field -> parent key column, e.g. {"circleMemberList": "id"}
+        self.normalize = normalize or {}
+        # natural key columns, rows with an existing key are updated in place
+        self.keys = tuple(keys or ())
+        # join columns indexed after the bulk load
+        self.indexes = list(indexes or [])
+        self.tableKeys = {}
+        self.pendingIndexes = []
+        self.queuedIndexes = set()
+        # built up front so a missing pyarrow fails before any crawling
+        self.parquetWriter = ParquetWriter(parquetPath, append=resume) if parquetPath else None
+        self.lockParquet = threading.Lock()
+        with self._handlersLock:
+            self._handlers.append(self)
         return
+
+    @classmethod
+    def closeAll(cls):
+        # drain the sink, close csv/parquet files, then commit the db writers
+        DataSink.closeShared()
+        with cls._handlersLock:
+            handlers = list(cls._handlers)
+            cls._handlers.clear()
+        for handler in handlers:
+            handler.createIndexes()
+            handler.close()
+        SQLiteWriter.closeAll()
+
+    @property
+    def writer(self):
+        # one connection and writer thread per db file, shared by all handlers
+        return SQLiteWriter.get(self.dbPath, batchSize=self.commit_every)
     
-    def writeAll(self, data):
-        # convert data to list if not already
+    def _chunks(self, data):
+        # yield data as lists of at most chunk_size records. generators are
+        # consumed lazily with islice, so only one chunk is held in memory
         if data is None:
             logger.warning("No data to write!")
             return
         # signle dict -> list
         if isinstance(data, dict):
-            data_list = [data]
-        # generator -> list
-        elif hasattr(data, '__iter__') and not isinstance(data, (str,)):
-            data_list = list(data)
-        elif isinstance(data, list):
-            data_list = data
+            yield [data]
+            return
+        # list or generator -> chunks
+        if hasattr(data, '__iter__') and not isinstance(data, (str,)):
+            iterator = iter(data)
         else:
             logger.warning(f"Unsupported data type: {type(data)}")
             return
 
-        if not data_list:
+        empty = True
+        while True:
+            chunk = list(itertools.islice(iterator, self.chunk_size))
+            if not chunk:
+                break
+            empty = False
+            yield chunk
+        if empty:
             logger.warning("No data to write after conversion!")
-            return
-        
-        self.writeDB(data_list)
-        self.writeCSV(data_list)
+
+    def writeAll(self, data):
+        # each chunk reaches disk as soon as it is complete
+        for chunk in self._chunks(data):
+            self.writeBatch(chunk)
+
+    def writeBatch(self, data: list):
+        # every enabled output for one list of records
+        self.writeDB(data)
+        self.writeCSV(data)
+        if self.parquetPath:
+            self.writeParquet(data)
+
+    def put(self, data):
+        # like writeAll, but the chunks are handed to the background sink. a
+        # generator is still consumed here, in the caller's thread
+        for chunk in self._chunks(data):
+            DataSink.shared().put(self, chunk)
     
     def writeCSV(self, data: list):
         with self.lockCSV:
-            df = pd.DataFrame(data)
-            mode = 'w' if self.csvFirstWrite else 'a'
-
-            df.to_csv(self.csvPath, index=False,
-                    mode=mode, encoding='utf-8',
-                    header=self.csvFirstWrite)
-            if self.csvFirstWrite:
-                logger.info(f"CSV file {self.csvPath} created")
-                self.csvFirstWrite = False
+            if self.csvWriter is None:
+                self.csvWriter = CSVWriter(self.csvPath, append=self.resume)
+                logger.info(f"CSV file {self.csvPath} opened")
+            self.csvWriter.writeRows(data)
             return
+
+    def writeParquet(self, data: list):
+        with self.lockParquet:
+            self.parquetWriter.writeRows(data)
+
+    def close(self):
+        with self.lockCSV:
+            if self.csvWriter is not None:
+                self.csvWriter.close()
+        with self.lockParquet:
+            if self.parquetWriter is not None:
+                self.parquetWriter.close()
+                logger.info(f"Parquet file {self.parquetPath} written")
     
     def _convert_sql_value(self, val):
         if isinstance(val, (list, dict)):
             return json.dumps(val, ensure_ascii=False)
-        elif isinstance(val, bool):
+        # bool and numpy scalars, which sqlite3 would otherwise bind as blobs
+        elif isinstance(val, numbers.Integral):
             return int(val)
+        elif isinstance(val, numbers.Real):
+            return float(val)
         return val
     
+    def _child_rows(self, data, field, parent_key, links=()):
+        # one row per nested item, linked to the parent by parentId and the
+        # parent's other key columns (links), e.g. dataId of an event listing.
+        # lists of dicts keep their keys as columns, scalars go to "value",
+        # comma separated strings (tags) are split into one row per entry
+        rows = []
+        for row in data:
+            parent_id = row.get(parent_key)
+            items = row.get(field)
+            if items is None or items == "":
+                continue
+            if isinstance(items, str):
+                items = [item.strip() for item in items.split(",") if item.strip()]
+            elif not isinstance(items, list):
+                items = [items]
+            for position, item in enumerate(items):
+                child = {"parentId": parent_id, "position": position}
+                if isinstance(item, dict):
+                    child.update(item)
+                else:
+                    child["value"] = item
+                child.update((link, row.get(link)) for link in links)
+                rows.append(child)
+        return rows
+
+    def _prepare_table(self, table_name, data, keys=(), foreign_key=None, indexes=()):
+        # register the batch in the table's schema and queue any ddl it needs
+        schema = self.schemas.get(table_name)
+        if schema is not None:
+            if schema.observe(data):
+                self.writer.call(functools.partial(schema.migrate, columns=dict(schema.columns)))
+            # child tables find new id columns in later batches
+            self._queue_indexes(table_name, indexes, self.tableKeys[table_name])
+            return
+
+        schema = self.schemas[table_name] = TableSchema(table_name, foreign_key)
+        schema.observe(data)
+        for key in keys:
+            schema.declare(key)
+        logger.debug(f"Creating table '{table_name}' with columns {schema.columns}")
+        if not self.append_db:
+            self.writer.execute(f'DROP TABLE IF EXISTS "{table_name}";')
+        self.writer.call(functools.partial(schema.migrate, columns=dict(schema.columns)))
+
+        # the natural key is a unique index rather than a PRIMARY KEY so that
+        # tables from earlier runs get it too, after dropping their duplicates
+        if keys:
+            key_cols = ', '.join(f'"{key}"' for key in keys)
+            not_null = ' AND '.join(f'"{key}" IS NOT NULL' for key in keys)
+            self.writer.execute(f'DELETE FROM "{table_name}" WHERE {not_null} AND rowid NOT IN '
+                                f'(SELECT MAX(rowid) FROM "{table_name}" WHERE {not_null} GROUP BY {key_cols});')
+            self.writer.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS "{table_name}_key" ON "{table_name}" ({key_cols});')
+        self.tableKeys[table_name] = tuple(keys)
+        self._queue_indexes(table_name, indexes, keys)
+        logger.info(f"DB table {table_name} created in {self.dbPath}")
+
+    def _queue_indexes(self, table_name, indexes, keys):
+        # secondary indexes are built once the bulk load is done, see createIndexes
+        # a leading key column is already covered by the key index
+        for col in indexes:
+            if col not in keys[:1] and (table_name, col) not in self.queuedIndexes:
+                self.queuedIndexes.add((table_name, col))
+                self.pendingIndexes.append((table_name, col))
+
+    def _insert(self, table_name, data):
+        # rows are grouped by their own column set, so an upsert never
+        # overwrites a column the row did not have with NULL
+        groups = {}
+        for row in data:
+            groups.setdefault(tuple(row), []).append(row)
+
+        schema = self.schemas[table_name]
+        for columns, rows in groups.items():
+            insert_sql = schema.insertSql(columns, self.tableKeys[table_name])
+            rows_to_insert = []
+            for row in rows:
+                row_values = [self._convert_sql_value(row.get(col, None)) for col in columns]
+                rows_to_insert.append(row_values)
+            # the writer thread batches these into large transactions
+            self.writer.executemany(insert_sql, rows_to_insert)
+        logger.debug(f"Queued {len(data)} rows for DB table '{table_name}'")
+
     def writeDB(self, data: list):
         if not data:
             logger.warning("No data to write to DB.")
             return
-        # sql is not thread-safe
+        # keeps table creation ahead of this table's first insert
         with self.lockDB:
-            table_name = os.path.splitext(os.path.basename(self.csvPath))[0]
-            first_row = data[0]
-            columns = list(first_row.keys())
-
-            # infererence of data types
-            def infer_type(value):
-                if isinstance(value, int):
-                    return "INTEGER"
-                elif isinstance(value, float):
-                    return "REAL"
-                elif isinstance(value, bool):
-                    return "INTEGER"
-                elif value is None:
-                    return "TEXT"
-                else:
-                    return "TEXT"
-
-            # sample the data to infer column types
-            def infer_column_type(col_name, sample_data, sample_size=10):
-                
-                samples = [row.get(col_name) for row in sample_data[:sample_size] if col_name in row]
-                types = set(infer_type(val) for val in samples if val is not None)
-                # INTEGER < REAL < TEXT
-                if not types:
-                    return "TEXT"
-                if "TEXT" in types:
-                    return "TEXT"
-                if "REAL" in types:
-                    return "REAL"
-                return "INTEGER"
-
-            # get column definitions
-            col_defs = []
-            for col in columns:
-                col_type = infer_column_type(col, data)
-                col_defs.append(f'"{col}" {col_type}')
-            if self.append_db:
-                create_table_sql = [f'CREATE TABLE IF NOT EXISTS "{table_name}" ({", ".join(col_defs)});']
-            else:
-                create_table_sql = [f'DROP TABLE IF EXISTS "{table_name}";', f'CREATE TABLE "{table_name}" ({", ".join(col_defs)});']
-
-            
-            conn = sqlite3.connect(self.dbPath)
-            cursor = conn.cursor()
-
-            try:
-                # create table if not exists at first write
-                if self.DBFirstWrite:
-                    logger.debug(f"Creating table '{table_name}' with SQL: {create_table_sql}")
-                    for sql in create_table_sql:
-                        cursor.execute(sql)
-                    conn.commit()
-                    logger.info(f"DB file {self.dbPath} created")
-                    self.DBFirstWrite = False
-
-                placeholders = ', '.join(['?'] * len(columns))
-                column_names_quoted = ', '.join([f'"{col}"' for col in columns])
-                insert_sql = f'INSERT INTO "{table_name}" ({column_names_quoted}) VALUES ({placeholders})'
-
-
-                # insert data in batches
-                rows_to_insert = []
-                for row in data:
-                    row_values = [self._convert_sql_value(row.get(col, None)) for col in columns]
-                    rows_to_insert.append(row_values)
-
-                for i in range(0, len(rows_to_insert), self.commit_every):
-                    batch = rows_to_insert[i:i+self.commit_every]
-                    cursor.executemany(insert_sql, batch)
-                    conn.commit()
-                    logger.debug(f"Committed batch of {len(batch)} rows")
-
-                logger.debug(f"Inserted {len(rows_to_insert)} rows into DB table '{table_name}'")
-            except Exception as e:
-                logger.error(f"DB write failed: {e}")
-            finally:
-                conn.close()
+            table_name = self.tableName
+            parent_rows = data
+            if self.normalize:
+                # normalized fields live only in their child tables
+                parent_rows = [{key: value for key, value in row.items() if key not in self.normalize} for row in data]
+            self._prepare_table(table_name, parent_rows, keys=self.keys, indexes=self.indexes)
+            self._insert(table_name, parent_rows)
+
+            parent_keys = self.tableKeys[table_name]
+            for field, parent_key in self.normalize.items():
+                child_name = f"{table_name}_{field}"
+                # children of a keyed parent carry its whole key, the foreign
+                # key needs a unique parent column set to point at
+                keyed = parent_key in parent_keys
+                links = tuple(key for key in parent_keys if key != parent_key) if keyed else ()
+                child_rows = self._child_rows(data, field, parent_key, links)
+                if child_name not in self.schemas and not child_rows:
+                    continue
+                # parent id, the scalar value and any *Id column get an index
+                indexes = [col for col in dict.fromkeys(key for row in child_rows for key in row)
+                           if col in ("parentId", "value") or (col.endswith("Id") and col not in links)]
+                foreign_key = None
+                if keyed:
+                    foreign_key = (table_name, tuple("parentId" if key == parent_key else key for key in parent_keys),
+                                   parent_keys)
+                # keyed parents are upserted, their children are replaced as a whole
+                self._prepare_table(child_name, child_rows,
+                                    keys=("parentId",) + links + ("position",) if keyed else (),
+                                    foreign_key=foreign_key, indexes=indexes)
+                if self.tableKeys[child_name]:
+                    parents = list(dict.fromkeys((row.get(parent_key),) + tuple(row.get(link) for link in links)
+                                                 for row in data))
+                    where = ' AND '.join(f'"{col}" = ?' for col in ("parentId",) + links)
+                    self.writer.executemany(f'DELETE FROM "{child_name}" WHERE {where}', parents)
+                if child_rows:
+                    self._insert(child_name, child_rows)
+
+    def createIndexes(self):
+        # secondary indexes on join columns, built once after the bulk load
+        with self.lockDB:
+            indexes, self.pendingIndexes = self.pendingIndexes, []
+        for table_name, col in indexes:
+            self.writer.execute(f'CREATE INDEX IF NOT EXISTS "{table_name}_{col}" ON "{table_name}" ("{col}");')
+
+    def query(self, sql, params=()):
+        # read back from the db once everything queued so far is committed
+        self.flush()
+        conn = sqlite3.connect(self.dbPath)
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+    def flush(self):
+        # wait until every queued row of this database is committed
+        self.writer.flush()
+
+
+# registered after the sink and writer hooks, so it runs first and in order
+atexit.register(cppDataHandler.closeAll)
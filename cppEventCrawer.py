@@ -1,30 +1,21 @@
 from loguru import logger
-from util.KVDatabase import KVDatabase
-from util.CppRequest import CppRequest
+from util.CrawlContext import CrawlContext
+from util import AllcppApi
+from util.error import CrawlError
 import os
 import sys
 import re
 import json
-from bs4 import BeautifulSoup
 import threading
 from collections import deque
 import concurrent.futures 
 import time
 import copy
 class cppEventCrawer:
-    def __init__(self, eventID = -1, URL = "", maxWorker = 10):
-        # read cookie config
-        config_path = os.path.join(os.path.dirname(os.path.realpath(sys.executable)), "config.json")
-        configDB = KVDatabase(config_path)
-
-        if not configDB.contains("cookie_path"):
-            configDB.insert("cookie_path", os.path.join(os.path.dirname(os.path.realpath(sys.executable)), "cookies.json"))
-        
-        cookie_path = configDB.get("cookie_path")
-
-        # load cookie with CppRequest
-        self.main_request = CppRequest(cookies_config_path=cookie_path)
-        self.global_cookieManager = self.main_request.cookieManager
+    def __init__(self, eventID = -1, URL = "", maxWorker = 10, context = None):
+        self.context = context or CrawlContext.default()
+        self.main_request = self.context.main_request
+        self.global_cookieManager = self.context.cookieManager
 
         # generate URL and load page
         if eventID == -1 and URL == "":
@@ -37,20 +28,17 @@ class cppEventCrawer:
                 exit(1)
 
         self.eventID = eventID
-        self.eventApi = "https://www.allcpp.cn/allcpp/event/getevents.do"
+        self.eventApi = AllcppApi.EVENT_INFO_API
 
         # get event status from api
         headers = self.main_request.getHeaders()
         headers["content-type"] = "application/json"
         response = self.main_request.post(self.eventApi, data=json.dumps({"id": eventID}), headers=headers)
-        if response.status_code != 200:
-            logger.error("api request failed")
+        try:
+            self.data = AllcppApi.getResult(response, "event api")
+        except CrawlError as e:
+            logger.error(str(e))
             return
-        data = json.loads(response.text)
-        if not data["isSuccess"]:
-            logger.error("bad response")
-            return
-        self.data = data["result"]
 
         logger.info("Succeeded loading eventID" + str(eventID))
         # get dataIDs for products
@@ -64,12 +52,8 @@ class cppEventCrawer:
                
     def _getDataIDs(self):
         # get dataIDs for products
-        pageUrl = f'https://www.allcpp.cn/allcpp/event/event.do?event={self.eventID}'
-        response = self.main_request.get(pageUrl)
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        spans = soup.find_all('span', attrs={'data-id': True})
-        data_ids = [span['data-id'] for span in spans]
+        response = self.main_request.get(AllcppApi.eventPageUrl(self.eventID))
+        data_ids = AllcppApi.parseDataIds(response.text)
         if len(data_ids) == 0:
             logger.error("No data_ids found")
         return data_ids
@@ -100,37 +84,21 @@ class cppEventCrawer:
             pageIndex = 1
 
             while fetchFlag and not emptyFlag:
-                circle_api = "https://www.allcpp.cn/api/circle/getcirclelist.do"
-                request_data = {'eventid': data_id,
-                        'search': '',
-                        'orderbyid': 0,
-                        'typeid': '',
-                        'pageindex': pageIndex,
-                        'pagesize': 50}
                 headers = self.main_request.getHeaders()
-                headers["content-type"] = "application/x-www-form-urlencoded; charset=UTF-8"
-                response = self.main_request.post(url=circle_api, data=request_data, headers=headers)
-                if response.status_code != 200:
-                    logger.error("api request failed")
-                    break
+                headers["content-type"] = AllcppApi.FORM_CONTENT_TYPE
+                response = self.main_request.post(url=AllcppApi.CIRCLE_LIST_API,
+                                                  data=AllcppApi.circleListForm(data_id, pageIndex), headers=headers)
                 try:
-                    data = json.loads(response.text)
-                except:
-                    logger.error("bad response" + str(self.PID))
-                    break
-                
-                if not data["isSuccess"]:
-                    logger.error("bad response")
+                    pageList = AllcppApi.getResult(response, f"circle list of EventID{data_id}")
+                except CrawlError as e:
+                    logger.error(str(e))
                     break
 
                 # get list on current page
-                pageList = data["result"]
                 emptyFlag = len(pageList) == 0
                 logger.debug(f"Getting Page {pageIndex}, {len(pageList)} circles from EventID{data_id}")
                 for circle in pageList:
-                    circle["eventId"] = self.eventID
-                    circle["dataId"] = data_id
-                    yield circle
+                    yield AllcppApi.listedEntry(circle, self.eventID, data_id)
                     num += 1
                     if limitation != -1 and num >= limitation:
                         fetchFlag = False
@@ -155,44 +123,22 @@ class cppEventCrawer:
             pageIndex = 1
 
             while fetchFlag and not EmptyFlag:
-                dojin_api = "https://www.allcpp.cn/allcpp/event/getDoujinshiList.do"
-                data = {
-                    "eventid": data_id,
-                    "searchstring": "",
-                    "orderbyid": 3,
-                    "typeid": "",
-                    "pageindex": pageIndex,
-                    "pagesize": 50,
-                    "sellstatus": "",
-                    "sectionid": ""
-                }
                 headers = self.main_request.getHeaders()
-                headers["content-type"] = "application/x-www-form-urlencoded; charset=UTF-8"
-                response = self.main_request.post(dojin_api, data=data, headers=headers)
-                if response.status_code != 200:
-                    with self.lock:
-                        logger.error("api request failed")
-                    break
-
+                headers["content-type"] = AllcppApi.FORM_CONTENT_TYPE
+                response = self.main_request.post(AllcppApi.PRODUCT_LIST_API,
+                                                  data=AllcppApi.productListForm(data_id, pageIndex), headers=headers)
                 try:
-                    data = json.loads(response.text)
-                except:
-                    logger.error("bad response" + str(self.PID))
-                    break
-                
-                if not data["isSuccess"]:
+                    pageList = AllcppApi.getResult(response, f"product list of EventID{data_id}")["list"]
+                except CrawlError as e:
                     with self.lock:
-                        logger.error("bad response")
+                        logger.error(str(e))
                     break
 
                 # get list on current page
-                pageList = data["result"]["list"]
                 EmptyFlag = len(pageList) == 0
                 logger.debug(f"Getting Page {pageIndex}, {len(pageList)} products from EventID{data_id}")
                 for product in pageList:
-                    product["eventId"] = self.eventID
-                    product["dataId"] = data_id
-                    yield product
+                    yield AllcppApi.listedEntry(product, self.eventID, data_id)
                     num += 1
                     if limitation != -1 and num >= limitation:
                         fetchFlag = False
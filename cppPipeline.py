@@ -0,0 +1,168 @@
+from cppCircleCrawer import cppCircleCrawer
+from cppProductCrawer import cppProductCrawer
+from cppUserCrawer import cppUserCrawer
+
+from util.DataSink import DataSink
+from util.FairScheduler import FairScheduler
+from util.TaskLedger import TaskLedger
+
+from loguru import logger
+import functools
+import itertools
+import threading
+
+
+class cppEventPipeline:
+    # streaming crawl of one event. circles and products coming out of the
+    # event listing are written to the Event_* tables and pushed straight
+    # onto bounded queues for the circle, product and user stages, so the
+    # detail crawl starts while the event is still paginating. user ids come
+    # from the structured circleMemberList of each listed circle. the
+    # listings and the stages share one FairScheduler pool, a listing runs
+    # one page per task under the "listing" stage
+    stages = ["circle", "product", "user"]
+    # listing entries per task, one api page
+    pageSize = 50
+    # output tables written by each stage
+    stageTables = {
+        "circle": ["Circles_Info", "Circle_ALL_Products", "Circle_Schedule"],
+        "product": ["Products_Info1", "Product_Schedule1"],
+        "user": ["User_Info", "user_Schedule", "user_ALL_Products"],
+    }
+
+    def __init__(self, eventCrawer, handler, context=None, workers=40, weights=None,
+                 queueSize=200, ledger=None, resume=False, incremental=False):
+        # handler(name) -> cppDataHandler for the table {eventId}_{name}
+        self.eventCrawer = eventCrawer
+        self.context = context
+        # a full stage queue blocks the listing, which keeps memory bounded.
+        # the two listing tasks may block, so at least one more worker drains
+        self.scheduler = FairScheduler(max(workers, 3), weights, queueSize)
+        self.seen = {stage: set() for stage in self.stages}
+        self.passed = {stage: set() for stage in self.stages}
+        self.hashes = {stage: {} for stage in self.stages}
+        self.seenLock = threading.Lock()
+        self.done = {stage: 0 for stage in self.stages}
+        self.failed = {stage: 0 for stage in self.stages}
+        self.skipped = {stage: 0 for stage in self.stages}
+        self.countLock = threading.Lock()
+
+        # every task goes through the ledger, so an interrupted run can resume
+        # and a later run can tell which listing entries changed
+        self.ledger = ledger
+        self.resume = resume
+        self.incremental = incremental
+        self.finished = {stage: {} for stage in self.stages}
+        if ledger is not None and (resume or incremental):
+            self.finished = {stage: ledger.hashes(stage) for stage in self.stages}
+            logger.info("Already done: " + ", ".join(f"{len(ids)} {stage}s" for stage, ids in self.finished.items()))
+
+        names = ["Event_circles", "Event_products", "Circles_Info", "Circle_ALL_Products", "Circle_Schedule",
+                 "Products_Info1", "Product_Schedule1", "User_Info", "user_Schedule", "user_ALL_Products"]
+        self.handlers = {name: handler(name) for name in names}
+
+    def _unchanged(self, stage, entityId, digest):
+        # done before, and for an incremental run from the same listing entry
+        if entityId not in self.finished[stage]:
+            return False
+        return self.resume or self.finished[stage][entityId] == digest
+
+    def submit(self, stage, entityId, digest=None, changed=False):
+        # queue an entity once per run. changed forces a fetch of an entity
+        # that is done, e.g. the members of a changed circle
+        with self.seenLock:
+            if entityId in self.seen[stage]:
+                return
+            if not changed and self._unchanged(stage, entityId, digest):
+                if entityId not in self.passed[stage]:
+                    self.passed[stage].add(entityId)
+                    with self.countLock:
+                        self.skipped[stage] += 1
+                return
+            self.seen[stage].add(entityId)
+            self.hashes[stage][entityId] = digest
+        if self.ledger is not None:
+            self.ledger.mark(stage, entityId, TaskLedger.PENDING)
+        self.scheduler.submit(stage, self._work, stage, entityId)
+
+    def _onCircle(self, circle):
+        digest = TaskLedger.digest(circle)
+        # members are fetched again when their circle's entry changed
+        changed = not self._unchanged("circle", circle["id"], digest)
+        self.submit("circle", circle["id"], digest)
+        for member in circle.get("circleMemberList") or []:
+            self.submit("user", member["userId"], changed=changed and self.incremental)
+
+    def _onProduct(self, product):
+        self.submit("product", product["doujinshiId"], TaskLedger.digest(product))
+
+    def processCircle(self, circle):
+        circleCrawer = cppCircleCrawer(circle, context=self.context)
+        self.handlers["Circles_Info"].put(circleCrawer.getInfo())
+        self.handlers["Circle_ALL_Products"].put(circleCrawer.getProducts())
+        self.handlers["Circle_Schedule"].put(circleCrawer.getSchedule())
+
+    def processProduct(self, product):
+        productCrawer = cppProductCrawer(product, context=self.context)
+        self.handlers["Products_Info1"].put(productCrawer.getInfo())
+        self.handlers["Product_Schedule1"].put(productCrawer.getSchedule())
+
+    def processUser(self, uid):
+        userCrawer = cppUserCrawer(UID=uid, context=self.context)
+        self.handlers["User_Info"].put(userCrawer.getInfo())
+        self.handlers["user_Schedule"].put(userCrawer.getSchedule())
+        self.handlers["user_ALL_Products"].put(userCrawer.getProducts())
+
+    def _list(self, name, items, callback):
+        # one page of a listing, then queue the next one behind the stages' tasks
+        try:
+            page = list(itertools.islice(items, self.pageSize))
+        except Exception as e:
+            logger.error(f"Event listing {name} failed: {e}")
+            return
+        if not page:
+            return
+        for item in page:
+            callback(item)
+        self.handlers[name].put(page)
+        self.scheduler.submit("listing", self._list, name, items, callback)
+
+    def _work(self, stage, entityId):
+        processes = {"circle": self.processCircle, "product": self.processProduct, "user": self.processUser}
+        sink = DataSink.shared()
+        since = sink.position()
+        dbSince = self.ledger.writer.position() if self.ledger is not None else None
+        try:
+            processes[stage](entityId)
+        except Exception as e:
+            self._fail(stage, entityId, e)
+            return
+        if self.ledger is not None:
+            # done is queued behind this task's rows, never ahead of them, and
+            # only if neither the sink nor the db failed to write them
+            handlers = [self.handlers[name] for name in self.stageTables[stage]]
+            sink.after(handlers, since,
+                       functools.partial(self.ledger.markDone, stage, entityId, dbSince,
+                                         digest=self.hashes[stage].get(entityId)),
+                       functools.partial(self._fail, stage, entityId, written=False))
+        with self.countLock:
+            self.done[stage] += 1
+
+    def _fail(self, stage, entityId, error, written=True):
+        # written=False: the crawl went through but its rows did not
+        logger.error(f"{stage} {entityId} failed: {error}")
+        if self.ledger is not None:
+            self.ledger.mark(stage, entityId, TaskLedger.FAILED, str(error))
+        with self.countLock:
+            self.failed[stage] += 1
+            if not written:
+                self.done[stage] -= 1
+
+    def run(self):
+        self.scheduler.submit("listing", self._list, "Event_circles", iter(self.eventCrawer.getCircles()), self._onCircle)
+        self.scheduler.submit("listing", self._list, "Event_products", iter(self.eventCrawer.getProducts()),
+                              self._onProduct)
+        self.scheduler.close()
+        for stage in self.stages:
+            logger.info(f"{stage} stage: {self.done[stage]} done, {self.failed[stage]} failed, "
+                        f"{self.skipped[stage]} skipped")
@@ -1,25 +1,16 @@
 from loguru import logger
-from util.KVDatabase import KVDatabase
-from util.CppRequest import CppRequest
+from util.CrawlContext import CrawlContext
+from util import AllcppApi
 import os
 import sys
 import re
 import json
 
 class cppProductCrawer:
-    def __init__(self, PID = -1, URL = ""):
-        # read cookie config
-        config_path = os.path.join(os.path.dirname(os.path.realpath(sys.executable)), "config.json")
-        configDB = KVDatabase(config_path)
-
-        if not configDB.contains("cookie_path"):
-            configDB.insert("cookie_path", os.path.join(os.path.dirname(os.path.realpath(sys.executable)), "cookies.json"))
-        
-        cookie_path = configDB.get("cookie_path")
-
-        # load cookie with CppRequest
-        self.main_request = CppRequest(cookies_config_path=cookie_path)
-        self.global_cookieManager = self.main_request.cookieManager
+    def __init__(self, PID = -1, URL = "", context = None):
+        self.context = context or CrawlContext.default()
+        self.main_request = self.context.main_request
+        self.global_cookieManager = self.context.cookieManager
 
         if PID == -1 and URL == "":
             logger.error("UID and URL cannot be empty at the same time")
@@ -31,16 +22,9 @@ class cppProductCrawer:
                 exit(1)
         # get APIs, fortunately, we can get all information with them
         self.PID = PID
-        self.infoApi = f"https://www.allcpp.cn/allcpp/djs/detail.do?doujinshiID={self.PID}"
+        self.infoApi = AllcppApi.productInfoUrl(self.PID)
         request = self.main_request.get(self.infoApi)
-        if request.status_code != 200:
-            logger.error("infoApi request failed" + str(self.PID))
-            return
-        data = json.loads(request.text)
-        if not data["isSuccess"]:
-            logger.error("bad response" + str(self.PID))
-            return
-        self.info = data["result"]
+        self.info = AllcppApi.getResult(request, f"infoApi of PID{self.PID}")
 
         logger.info("Successfully load PID" + str(PID))
         return
@@ -56,27 +40,11 @@ class cppProductCrawer:
     def getSchedule(self):
         # get user's schedule
         num = 0
-        for isnew in [0, 1]:
-            scheduleApi = "".join(["https://www.allcpp.cn/allcpp/djs/joinedEvent.do?doujinshiid=",
-                                    str(self.PID),
-                                    "&isnew=",
-                                    str(isnew)])
-            response = self.main_request.get(scheduleApi)
-            if response.status_code != 200:
-                logger.error("scheduleApi request failed" + str(self.PID))
-                return
-            try:
-                data = json.loads(response.text)
-            except:
-                logger.error("bad response" + str(self.PID))
-                return
-            if not data["isSuccess"]:
-                logger.error("bad response" + str(self.PID))
-                return
-            pageList = data["result"]
+        for isnew in AllcppApi.PRODUCT_SCHEDULE_LISTS:
+            response = self.main_request.get(AllcppApi.productScheduleUrl(self.PID, isnew))
+            pageList = AllcppApi.getResult(response, f"scheduleApi of PID{self.PID}")
             logger.debug(f"Getting Page {len(pageList)} schedule, [isnew] = {isnew} from PID{self.PID}")
             for event in pageList:
-                event["isnew"] = isnew
                 num += 1
-                yield event
+                yield AllcppApi.productEvent(self.PID, isnew, event)
         logger.info(f"Successfully get {num} schedule(s) from PID{self.PID}")
\ No newline at end of file
@@ -1,27 +1,156 @@
 
-from util.KVDatabase import KVDatabase
 from util.CppRequest import CppRequest
-from util.TimeService import TimeService
 from util.CookieManager import CookieManager
+from util.SessionPool import SessionPool
+from util.CrawlContext import CrawlContext
+from util.ResponseDecoder import decodeJson
+from util.TaskLedger import TaskLedger
+from util.FairScheduler import FairScheduler
 
 from cppEventCrawer import cppEventCrawer
 from cppDataHandler import cppDataHandler
 from cppCircleCrawer import cppCircleCrawer
 from cppUserCrawer import cppUserCrawer
 from cppProductCrawer import cppProductCrawer
+from cppPipeline import cppEventPipeline
 
-import concurrent.futures
+import asyncio
 from loguru import logger
-import pandas as pd
 import os
 import sys
 import argparse
-import json
 import time
 import re
-from tqdm import tqdm 
-from threading import Lock
+import sqlite3
 from datetime import datetime
+
+# default share of the worker pool, and so of the request budget, per
+# stage: event listings first, then product details, circles and users
+STAGE_WEIGHTS = {
+    "listing": 8,
+    "product": 4,
+    "circle": 2,
+    "user": 1,
+}
+
+# nested fields written to indexed child tables with --normalize,
+# table -> {field: parent key column}
+NORMALIZED_FIELDS = {
+    "Event_circles": {"circleMemberList": "id"},
+    "Event_products": {"tag": "doujinshiId"},
+    "Circles_Info": {"circleMemberList": "id"},
+    "Products_Info1": {"tag": "id"},
+    "User_Info": {"circleList": "id"},
+}
+
+# natural key per table, re-runs upsert on it instead of appending duplicates
+TABLE_KEYS = {
+    "Event_circles": ("id", "dataId"),
+    "Event_products": ("doujinshiId", "dataId"),
+    "Circles_Info": ("id",),
+    "Circle_ALL_Products": ("id", "circleId"),
+    "Circle_Schedule": ("circleId", "eventId"),
+    "Products_Info1": ("id",),
+    "Product_Schedule1": ("doujinshiId", "id", "isnew"),
+    "User_Info": ("id",),
+    "user_Schedule": ("uid", "eventId", "isNew", "isWannaGo"),
+    "user_ALL_Products": ("id", "userId"),
+}
+
+# join columns, indexed once the crawl has loaded the tables
+TABLE_INDEXES = {
+    "Event_products": ["circleId", "userId"],
+    "Circle_ALL_Products": ["circleId"],
+    "Circle_Schedule": ["eventId"],
+    "Product_Schedule1": ["id"],
+    "user_Schedule": ["eventId"],
+    "user_ALL_Products": ["userId"],
+}
+
+
+def toIds(values):
+    # plain ints, numpy scalars from read_csv would end up as blobs in the
+    # circleId/doujinshiId key and join columns
+    return [int(value) for value in values]
+
+
+def finish():
+    # drain the sink, close the output files and commit the db writers
+    cppDataHandler.closeAll()
+
+
+async def run_async_pipeline(page, cookie_path, myUID, force=False, concurrency=100, parquet=False, normalize=False):
+    # the whole event pipeline on one event loop, concurrency is bounded by
+    # the request semaphore and the shared rate limiter
+    from tqdm import tqdm
+    from util.AsyncCppRequest import AsyncCppRequest
+    import cppAsyncCrawer
+    m = re.search(r'event=(\d+)', page)
+    if m is None:
+        logger.error("Bad URL")
+        exit(1)
+    eventId = m.group(1)
+
+    def handler(name):
+        return cppDataHandler(path=f"{eventId}_{name}", db_id=f'{eventId}', force=force, parquet=parquet,
+                              normalize=NORMALIZED_FIELDS.get(name) if normalize else None,
+                              keys=TABLE_KEYS.get(name), indexes=TABLE_INDEXES.get(name))
+
+    async def write(dataHandler, data):
+        # the sink thread does the disk writes, off the event loop
+        if hasattr(data, '__aiter__'):
+            data = [row async for row in data]
+        dataHandler.put(data)
+
+    async with AsyncCppRequest(cookies_config_path=cookie_path, concurrency=concurrency) as request:
+        data_ids = await cppAsyncCrawer.getDataIds(request, eventId)
+        logger.info(f"Found {len(data_ids)} DataIDs: {data_ids}")
+        products = [p async for p in cppAsyncCrawer.getEventProducts(request, eventId, data_ids)]
+        circles = [c async for c in cppAsyncCrawer.getEventCircles(request, eventId, data_ids)]
+        await write(handler("Event_products"), products)
+        await write(handler("Event_circles"), circles)
+        logger.warning(f"Event {eventId} has been loaded")
+
+        allproducts = list(dict.fromkeys(p["doujinshiId"] for p in products))
+        allcircles = list(dict.fromkeys(c["id"] for c in circles))
+        user_ids = list(dict.fromkeys(member["userId"] for c in circles for member in (c.get("circleMemberList") or [])))
+        logger.info(f"Total {len(allcircles)} circles, {len(allproducts)} products and {len(user_ids)} users in the event")
+
+        circleDataHandler = handler("Circles_Info")
+        circleProductsDataHandler = handler("Circle_ALL_Products")
+        circleScheduleDataHandler = handler("Circle_Schedule")
+        productDataHandler = handler("Products_Info1")
+        productScheduleDataHandler = handler("Product_Schedule1")
+        userDataHandler = handler("User_Info")
+        userScheduleDataHandler = handler("user_Schedule")
+        userProduceDataHandler = handler("user_ALL_Products")
+
+        async def process_circle(circle):
+            await write(circleDataHandler, await cppAsyncCrawer.getCircleInfo(request, circle, myUID))
+            await write(circleProductsDataHandler, cppAsyncCrawer.getCircleProducts(request, circle))
+            await write(circleScheduleDataHandler, cppAsyncCrawer.getCircleSchedule(request, circle))
+
+        async def process_product(product):
+            await write(productDataHandler, await cppAsyncCrawer.getProductInfo(request, product))
+            await write(productScheduleDataHandler, cppAsyncCrawer.getProductSchedule(request, product))
+
+        async def process_user(uid):
+            await write(userDataHandler, await cppAsyncCrawer.getUserInfo(request, uid))
+            await write(userScheduleDataHandler, cppAsyncCrawer.getUserSchedule(request, uid))
+            await write(userProduceDataHandler, cppAsyncCrawer.getUserProducts(request, uid))
+
+        tasks = [process_user(uid) for uid in user_ids] \
+              + [process_product(product) for product in allproducts] \
+              + [process_circle(circle) for circle in allcircles]
+        for task in tqdm(asyncio.as_completed(tasks), total=len(tasks)):
+            # one failed entity must not end the run
+            try:
+                await task
+            except Exception as e:
+                logger.error(f"Task failed: {e}")
+    await asyncio.to_thread(finish)
+
+
 def main():
     # get args
     parser = argparse.ArgumentParser()
@@ -43,6 +172,46 @@ def main():
     parser.add_argument("--maxRatePerMinute", type=int,
                         default=100,
                         help="max request attempts within 60s. <= 0 for infinity attempts")
+    parser.add_argument("--endpointRatePerMinute", type=str, action="append",
+                        default=[],
+                        help="per-endpoint budget as name=rate, e.g. productDetail=60. repeatable")
+    parser.add_argument("--workers", type=int,
+                        default=40,
+                        help="worker threads shared by every stage")
+    parser.add_argument("--stageWeight", type=str, action="append",
+                        default=[],
+                        help="share of the workers for a stage as name=weight, e.g. user=2. "
+                             "stages: listing, product, circle, user. repeatable")
+    parser.add_argument("--cache", type=str,
+                        default="",
+                        help="sqlite file for the http response cache, empty to disable")
+    parser.add_argument("--metrics", type=str,
+                        default="",
+                        help="request metrics file, .json for a json snapshot, otherwise prometheus text")
+    parser.add_argument("--metricsInterval", type=int,
+                        default=30,
+                        help="seconds between metrics snapshots")
+    parser.add_argument("--async", dest="async_mode", type=bool,
+                        default=False,
+                        help="run the pipeline on a single asyncio event loop")
+    parser.add_argument("--concurrency", type=int,
+                        default=100,
+                        help="max in-flight requests in async mode")
+    parser.add_argument("--parquet", type=bool,
+                        default=False,
+                        help="also write every table as {eventId}_*.parquet, needs pyarrow")
+    parser.add_argument("--normalize", type=bool,
+                        default=False,
+                        help="store nested fields like circleMemberList as indexed child tables in the db")
+    parser.add_argument("--pipeline", type=bool,
+                        default=False,
+                        help="stream circles, products and users from the event listing into the stages")
+    parser.add_argument("--resume", type=bool,
+                        default=False,
+                        help="continue an interrupted --pipeline run, skipping tasks the ledger marks done")
+    parser.add_argument("--incremental", type=bool,
+                        default=False,
+                        help="re-crawl an event, fetching only circles, products and members whose listing entry changed")
     parser.add_argument("--retryInterval", type=int,
                         default=30,
                         help="max retry interval. <= 0 for no waiting")
@@ -64,16 +233,14 @@ def main():
     # 日志配置：输出到文件
     logger.add(log_file, rotation="50 MB", retention="10 days", compression="zip")
     logger.info(f"日志文件已启用: {log_file}")
-    # get cookie config
-    config_path = os.path.join(os.path.dirname(os.path.realpath(sys.executable)), "config.json")
-    configDB = KVDatabase(config_path)
-
-    if not configDB.contains("cookie_path"):
-        configDB.insert("cookie_path", os.path.join(os.path.dirname(os.path.realpath(sys.executable)), "cookies.json"))
-    
-    cookie_path = configDB.get("cookie_path")
-
-    main_request = CppRequest(cookies_config_path=cookie_path)
+    # one keep-alive pool for every crawler, one connection per worker thread
+    sessionPool = SessionPool.configure(poolMaxsize=args.workers)
+    # config, cookies and request client shared by every crawler of this run
+    context = CrawlContext(sessionPool=sessionPool)
+    CrawlContext.setDefault(context)
+    configDB = context.configDB
+    cookie_path = context.cookie_path
+    main_request = context.main_request
 
     if args.refresh_cookie:
         global_cookieManager = main_request.cookieManager
@@ -96,101 +263,161 @@ def main():
     configDB.insert("maxRatePerMinute", args.maxRatePerMinute)
     configDB.insert("retryInterval", args.retryInterval)
     configDB.insert("maxWaitTime", args.maxWaitTime)
+    CppRequest.configureRetry(args.maxRetry, args.retryInterval, args.maxWaitTime)
+    if args.cache:
+        CppRequest.configureCache(args.cache, configDB.get("responseCacheTTL"))
+        logger.info(f"Response cache enabled: {args.cache}")
+    if args.metrics:
+        CppRequest.metrics.startReporter(args.metrics, args.metricsInterval)
+        logger.info(f"Request metrics written to {args.metrics} every {args.metricsInterval} seconds")
+
+    endpointRatePerMinute = {}
+    for item in args.endpointRatePerMinute:
+        name, rate = item.split("=", 1)
+        endpointRatePerMinute[name] = int(rate)
+    configDB.insert("endpointRatePerMinute", endpointRatePerMinute)
+    CppRequest.configureRateLimit(args.maxRatePerMinute, endpointRatePerMinute)
+
+    stageWeights = dict(STAGE_WEIGHTS)
+    for item in args.stageWeight:
+        name, weight = item.split("=", 1)
+        if float(weight) <= 0:
+            logger.error(f"Stage weight must be positive: {item}")
+            exit(1)
+        stageWeights[name] = float(weight)
 
     # get selfUID
     request = main_request.get("https://www.allcpp.cn/allcpp/circle/getCircleMannage.do")
     if request.status_code != 200:
         logger.error("UserApi request failed")
         exit(1)
-    data = json.loads(request.text)
+    data = decodeJson(request)
     if not data["isSuccess"]:
         logger.error("bad response")
         exit(1)
-    KVDatabase(config_path).insert("UID", data["result"]["joinCircleList"][0]["userId"])
+    context.setUID(data["result"]["joinCircleList"][0]["userId"])
     logger.info("Successfully login, your UID is " + str(data["result"]["joinCircleList"][0]["userId"]))
+
+    if args.async_mode:
+        asyncio.run(run_async_pipeline(args.page, cookie_path, data["result"]["joinCircleList"][0]["userId"],
+                                       force=args.force, concurrency=args.concurrency, parquet=args.parquet,
+                                       normalize=args.normalize))
+        return
     
     # get event products and event circles
-    eventCrawer = cppEventCrawer(URL = args.page)
+    eventCrawer = cppEventCrawer(URL = args.page, context=context)
     print(eventCrawer.data_ids)
 
     eventId = eventCrawer.getEventID()
-    productEventDataHandler = cppDataHandler(path=f"{eventId}_Event_products", db_id=f'{eventId}',force=args.force)
-    #circleEventDataHandler = cppDataHandler(path=f"{eventId}_Event_circles", db_id=f'{eventId}',force=args.force)
-    with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-        #future1 = executor.submit(circleEventDataHandler.writeAll, eventCrawer.getCircles())
-        future2 = executor.submit(productEventDataHandler.writeAll, eventCrawer.getProducts())
-        concurrent.futures.wait([future2])
+
+    def handler(name):
+        # a resumed or incremental run appends to the entity tables, the event
+        # listing is crawled again in full
+        listing = name.startswith("Event_")
+        keep = args.resume or args.incremental
+        return cppDataHandler(path=f"{eventId}_{name}", db_id=f'{eventId}',
+                              force=args.force or (keep and listing), parquet=args.parquet,
+                              normalize=NORMALIZED_FIELDS.get(name) if args.normalize else None,
+                              keys=TABLE_KEYS.get(name), indexes=TABLE_INDEXES.get(name),
+                              resume=keep and not listing)
+
+    if args.pipeline or args.resume or args.incremental:
+        ledger = TaskLedger(f"{eventId}.db", table=f"{eventId}_Tasks")
+        cppEventPipeline(eventCrawer, handler, context, workers=args.workers, weights=stageWeights,
+                         ledger=ledger, resume=args.resume, incremental=args.incremental).run()
+        finish()
+        return
+
+    # every stage runs on one weighted pool, the ids are all in memory so its queues are unbounded
+    scheduler = FairScheduler(args.workers, stageWeights)
+
+    productEventDataHandler = handler("Event_products")
+    circleEventDataHandler = handler("Event_circles")
+    scheduler.submit("listing", circleEventDataHandler.writeAll, eventCrawer.getCircles())
+    scheduler.submit("listing", productEventDataHandler.writeAll, eventCrawer.getProducts())
+    scheduler.join()
     logger.warning(f"Event {eventId} has been loaded")
 
+    # heavy imports are deferred until the crawl actually needs them
+    import pandas as pd
+    from tqdm import tqdm
     dataProducts = pd.read_csv(f"{eventId}_Event_products.csv")
     dataCircle = pd.read_csv(f"{eventId}_Event_circles.csv")
 
     # get circles and products entries from the Event
-    allcircles = dataCircle["id"].unique()
-    allproducts = dataProducts["doujinshiId"].unique()
+    allcircles = toIds(dataCircle["id"].unique())
+    allproducts = toIds(dataProducts["doujinshiId"].unique())
     logger.info(f"Total {len(allcircles)} circles and {len(allproducts)} products in the event")
 
     # dataHandlers
-    circleDataHandler = cppDataHandler(path=f"{eventId}_Circles_Info",db_id=f'{eventId}', force=args.force)
-    circleProductsDataHandler = cppDataHandler(path=f"{eventId}_Circle_ALL_Products",db_id=f'{eventId}', force=args.force)
-    circleScheduleDataHandler = cppDataHandler(path=f"{eventId}_Circle_Schedule",db_id=f'{eventId}', force=args.force)
+    circleDataHandler = handler("Circles_Info")
+    circleProductsDataHandler = handler("Circle_ALL_Products")
+    circleScheduleDataHandler = handler("Circle_Schedule")
 
-    productDataHandler = cppDataHandler(path=f"{eventId}_Products_Info1",db_id=f'{eventId}', force=args.force)
-    productScheduleDataHandler = cppDataHandler(path=f"{eventId}_Product_Schedule1",db_id=f'{eventId}', force=args.force)
+    productDataHandler = handler("Products_Info1")
+    productScheduleDataHandler = handler("Product_Schedule1")
 
-    userDataHandler = cppDataHandler(path=f"{eventId}_User_Info",db_id=f'{eventId}', force=args.force)
-    userScheduleDataHandler = cppDataHandler(path=f"{eventId}_user_Schedule",db_id=f'{eventId}', force=args.force)
-    userProduceDataHandler = cppDataHandler(path=f"{eventId}_user_ALL_Products",db_id=f'{eventId}', force=args.force)
+    userDataHandler = handler("User_Info")
+    userScheduleDataHandler = handler("user_Schedule")
+    userProduceDataHandler = handler("user_ALL_Products")
 
     # get all UID from circles
-    user_ids = []
-    for entry in tqdm(dataCircle["circleMemberList"]):
-        user_ids.extend(re.findall(r"'userId': (\d+)", entry))
-    user_ids = list(set(map(int, user_ids)))  # unique
+    if args.normalize:
+        # members are rows of the indexed child table
+        try:
+            user_ids = [row[0] for row in circleEventDataHandler.query(
+                f'SELECT DISTINCT "userId" FROM "{circleEventDataHandler.tableName}_circleMemberList"')]
+        except sqlite3.OperationalError:
+            user_ids = []
+    else:
+        user_ids = []
+        for entry in tqdm(dataCircle["circleMemberList"]):
+            user_ids.extend(re.findall(r"'userId': (\d+)", entry))
+        user_ids = list(set(map(int, user_ids)))  # unique
     logger.info(f"Total {len(user_ids)} users in the event")
 
-    lock1, lock2, lock3 = Lock(), Lock(), Lock()
+    # fetching runs in the worker threads without any lock, finished records
+    # go to the background sink which batches the csv/db writes
     def process_circle(circle):
-        circleCrawer = cppCircleCrawer(circle)
-        with lock1:
-            circleDataHandler.writeAll(circleCrawer.getInfo())
-            circleProductsDataHandler.writeAll(circleCrawer.getProducts())
-            circleScheduleDataHandler.writeAll(circleCrawer.getSchedule())
+        circleCrawer = cppCircleCrawer(circle, context=context)
+        circleDataHandler.put(circleCrawer.getInfo())
+        circleProductsDataHandler.put(circleCrawer.getProducts())
+        circleScheduleDataHandler.put(circleCrawer.getSchedule())
     num = 0
     length = len(allproducts)
 
     def process_product(product):
-        productCrawer = cppProductCrawer(product)
-        with lock2:
-            productDataHandler.writeAll(productCrawer.getInfo())
-            productScheduleDataHandler.writeAll(productCrawer.getSchedule())
+        productCrawer = cppProductCrawer(product, context=context)
+        productDataHandler.put(productCrawer.getInfo())
+        productScheduleDataHandler.put(productCrawer.getSchedule())
 
 
     def process_user(uid):
-        userCrawer = cppUserCrawer(UID=uid)
-        with lock3:
-            userDataHandler.writeAll(userCrawer.getInfo())
-            userScheduleDataHandler.writeAll(userCrawer.getSchedule())
-            userProduceDataHandler.writeAll(userCrawer.getProducts())
-
-
-    # thread pool for execution
-    def execute_parallel_tasks(task_func, task_list, max_workers=100):
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = {executor.submit(task_func, task): task for task in task_list}
-            for future in tqdm(concurrent.futures.as_completed(futures), total=len(futures)):
-                # try:
-                    future.result()
-                # except Exception as e:
-                #     logger.error(f"Error: {e}")
-                #     logger.error(f"Task {futures[future]} failed")
-                #     continue
-
-    with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-        future1 = executor.submit(execute_parallel_tasks, process_user, user_ids, max_workers=20)
-        future2 = executor.submit(execute_parallel_tasks, process_product, allproducts, max_workers=10)
-        future3 = executor.submit(execute_parallel_tasks, process_circle, allcircles, max_workers=10)
-        concurrent.futures.wait([future1, future2, future3])    
+        userCrawer = cppUserCrawer(UID=uid, context=context)
+        userDataHandler.put(userCrawer.getInfo())
+        userScheduleDataHandler.put(userCrawer.getSchedule())
+        userProduceDataHandler.put(userCrawer.getProducts())
+
+
+    progress = tqdm(total=len(user_ids) + len(allproducts) + len(allcircles))
+
+    def tracked(task_func):
+        def run(task):
+            try:
+                task_func(task)
+            finally:
+                progress.update()
+        return run
+
+    for uid in user_ids:
+        scheduler.submit("user", tracked(process_user), uid)
+    for product in allproducts:
+        scheduler.submit("product", tracked(process_product), product)
+    for circle in allcircles:
+        scheduler.submit("circle", tracked(process_circle), circle)
+    scheduler.close()
+    progress.close()
+    finish()
 
 
 if __name__ == "__main__":
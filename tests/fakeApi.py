@@ -0,0 +1,90 @@
+import json
+import numbers
+import re
+from types import SimpleNamespace
+from urllib.parse import urlparse, parse_qs
+
+# in-process stand-in for the allcpp endpoints, for crawlers built with
+# FakeContext. failures maps an endpoint path fragment to the ids answered
+# with 404
+
+
+class Int64:
+    # integer scalar that is not an int subclass, like numpy.int64
+    def __init__(self, value):
+        self.value = value
+
+    def __int__(self):
+        return self.value
+
+    def __index__(self):
+        return self.value
+
+
+numbers.Integral.register(Int64)
+
+
+class FakeRequest:
+    def __init__(self, members=None, failures=None):
+        # members: circleId -> [userId]
+        self.members = members or {10000: [100002, 100003]}
+        self.failures = failures or {}
+
+    def _response(self, url, status, body):
+        content = json.dumps(body).encode("utf-8") if status == 200 else b"Not Found"
+        return SimpleNamespace(status_code=status, content=content, url=url)
+
+    def _ok(self, url, result):
+        return self._response(url, 200, {"isSuccess": True, "result": result})
+
+    def get(self, url, data=None, headers=None):
+        parsed = urlparse(url)
+        path = parsed.path
+        params = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        for fragment, ids in self.failures.items():
+            if fragment in path and any(str(i) in url for i in ids):
+                return self._response(url, 404, None)
+        events = [{"id": 9001 - k, "eventMainId": 9001 - k, "name": f"event{k}",
+                   "enterTime": 1700000000000} for k in range(2)]
+        if path.endswith("/api/circle/getcircledetail.do"):
+            circleId = int(params["circleid"])
+            return self._ok(url, {"id": circleId, "name": f"circle{circleId}"})
+        if path.endswith("/allcpp/circle/mainEvent.do"):
+            return self._ok(url, events)
+        if path.endswith("/allcpp/circle/allBenZi.do"):
+            rows = [{"id": 500000, "name": "product"}] if params["page"] == "1" else []
+            return self._ok(url, {"rows": rows})
+        m = re.search(r"/allcpp/loginregister/getUser/(\d+)\.do", path)
+        if m:
+            return self._ok(url, {"userMain": {"id": int(m.group(1)), "nickname": f"user{m.group(1)}"},
+                                  "circleList": []})
+        if path.endswith("/allcpp/doujinshi/getAuthorDoujinshiList.do"):
+            return self._ok(url, {"list": []})
+        if path.endswith("/allcpp/user/getUserEventList.do"):
+            return self._ok(url, {"list": events if params["pageindex"] == "1" else []})
+        if path.endswith("/allcpp/djs/detail.do"):
+            return self._ok(url, {"id": int(params["doujinshiID"]), "name": "product"})
+        if path.endswith("/allcpp/djs/joinedEvent.do"):
+            return self._ok(url, events)
+        return self._response(url, 404, None)
+
+
+class FakeContext:
+    def __init__(self, request=None):
+        self.main_request = request or FakeRequest()
+        self.cookieManager = None
+        self.UID = 1
+
+
+class FakeEventCrawer:
+    # the event listing for a FakeRequest
+    def __init__(self, request):
+        self.request = request
+
+    def getCircles(self):
+        for circleId, members in self.request.members.items():
+            yield {"id": circleId, "eventId": 9001, "dataId": 90010,
+                   "circleMemberList": [{"userId": uid} for uid in members]}
+
+    def getProducts(self):
+        yield {"doujinshiId": 500000, "id": 500000, "circleId": 10000, "eventId": 9001, "dataId": 90010}
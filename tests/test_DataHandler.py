@@ -0,0 +1,31 @@
+from cppDataHandler import cppDataHandler
+
+
+def test_child_id_columns_of_later_batches_are_indexed(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    handler = cppDataHandler(path="9001_Circles_Info", db_id="9001", force=True,
+                             normalize={"circleMemberList": "id"}, keys=("id",))
+    handler.writeAll([{"id": 1, "circleMemberList": [{"role": 0}]}])
+    handler.writeAll([{"id": 2, "circleMemberList": [{"role": 0, "userId": 100}]}])
+    handler.createIndexes()
+    indexes = {row[0] for row in handler.query(
+        "SELECT name FROM sqlite_master WHERE type='index' AND tbl_name='9001_Circles_Info_circleMemberList'")}
+    cppDataHandler.closeAll()
+    assert "9001_Circles_Info_circleMemberList_userId" in indexes
+    assert "9001_Circles_Info_circleMemberList_parentId" not in indexes
+
+
+def test_children_of_each_sub_event_are_kept(tmp_path, monkeypatch):
+    # the same circle listed under two sub-events
+    monkeypatch.chdir(tmp_path)
+    handler = cppDataHandler(path="9001_Event_circles", db_id="9001", force=True,
+                             normalize={"circleMemberList": "id"}, keys=("id", "dataId"))
+    handler.writeAll([{"id": 1, "dataId": 11, "circleMemberList": [{"userId": 100}]},
+                      {"id": 1, "dataId": 12, "circleMemberList": [{"userId": 200}]}])
+    handler.writeAll([{"id": 1, "dataId": 11, "circleMemberList": [{"userId": 100}, {"userId": 300}]}])
+    members = handler.query('SELECT "dataId", "userId" FROM "9001_Event_circles_circleMemberList" '
+                            'ORDER BY "dataId", "position"')
+    mismatches = handler.query('PRAGMA foreign_key_check')
+    cppDataHandler.closeAll()
+    assert members == [(11, 100), (11, 300), (12, 200)]
+    assert mismatches == []
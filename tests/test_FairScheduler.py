@@ -0,0 +1,42 @@
+import sys
+import threading
+
+from util.FairScheduler import FairScheduler
+
+
+def test_failing_tasks_keep_the_workers():
+    scheduler = FairScheduler(workers=2)
+    done = []
+    lock = threading.Lock()
+
+    def task(i):
+        if i % 3 == 0:
+            sys.exit(1)
+        if i % 3 == 1:
+            raise ValueError(i)
+        with lock:
+            done.append(i)
+
+    for i in range(30):
+        scheduler.submit("circle", task, i)
+    joiner = threading.Thread(target=scheduler.close, daemon=True)
+    joiner.start()
+    joiner.join(timeout=10)
+    assert not joiner.is_alive()
+    assert sorted(done) == list(range(2, 30, 3))
+    assert all(not thread.is_alive() for thread in scheduler.threads)
+
+
+def test_weights_share_the_workers():
+    # a single worker serves the heavier stage first while both are backlogged
+    scheduler = FairScheduler(workers=1, weights={"listing": 4, "user": 1})
+    order = []
+    gate = threading.Event()
+    scheduler.submit("block", gate.wait)
+    for i in range(10):
+        scheduler.submit("user", order.append, "user")
+        scheduler.submit("listing", order.append, "listing")
+    gate.set()
+    scheduler.close()
+    assert order[:5].count("listing") >= 3
+    assert len(order) == 20
@@ -0,0 +1,91 @@
+import sqlite3
+
+from cppDataHandler import cppDataHandler
+from cppPipeline import cppEventPipeline
+from util.TaskLedger import TaskLedger
+
+from fakeApi import FakeContext, FakeEventCrawer, FakeRequest, Int64
+
+
+def runPipeline(request, **kwargs):
+    def handler(name):
+        return cppDataHandler(path=f"9001_{name}", db_id="9001", force=True)
+
+    ledger = TaskLedger("9001.db", table="9001_Tasks")
+    cppEventPipeline(FakeEventCrawer(request), handler, FakeContext(request), workers=4, ledger=ledger,
+                     **kwargs).run()
+    cppDataHandler.closeAll()
+    return ledger
+
+
+def test_failed_fetch_is_recorded_as_failed(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    request = FakeRequest(failures={"getUserEventList.do": [100003]})
+    ledger = runPipeline(request)
+
+    assert ledger.statuses("user") == {100002: TaskLedger.DONE, 100003: TaskLedger.FAILED}
+    assert ledger.statuses("circle") == {10000: TaskLedger.DONE}
+    assert ledger.statuses("product") == {500000: TaskLedger.DONE}
+
+    # a resumed run retries the failed user only
+    request.failures = {}
+    ledger = runPipeline(request, resume=True)
+    assert ledger.statuses("user") == {100002: TaskLedger.DONE, 100003: TaskLedger.DONE}
+    conn = sqlite3.connect("9001.db")
+    try:
+        uids = [row[0] for row in conn.execute('SELECT DISTINCT "uid" FROM "9001_user_Schedule" ORDER BY "uid"')]
+    finally:
+        conn.close()
+    assert uids == [100002, 100003]
+
+
+def test_failed_write_is_recorded_as_failed(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    writeCSV = cppDataHandler.writeCSV
+
+    def failingWriteCSV(self, data):
+        if self.csvPath.startswith("9001_user_Schedule"):
+            raise OSError("disk full")
+        writeCSV(self, data)
+
+    monkeypatch.setattr(cppDataHandler, "writeCSV", failingWriteCSV)
+    ledger = runPipeline(FakeRequest())
+    assert ledger.statuses("user") == {100002: TaskLedger.FAILED, 100003: TaskLedger.FAILED}
+    assert ledger.statuses("circle") == {10000: TaskLedger.DONE}
+
+
+def test_schedules_join_their_entities(tmp_path, monkeypatch):
+    # default mode: ids come from read_csv as numpy scalars
+    import main
+    from cppCircleCrawer import cppCircleCrawer
+    from cppProductCrawer import cppProductCrawer
+
+    monkeypatch.chdir(tmp_path)
+    context = FakeContext()
+
+    def handler(name):
+        return cppDataHandler(path=f"9001_{name}", db_id="9001", force=True,
+                              keys=main.TABLE_KEYS.get(name), indexes=main.TABLE_INDEXES.get(name))
+
+    for circle in main.toIds([Int64(10000)]):
+        circleCrawer = cppCircleCrawer(circle, context=context)
+        handler("Circles_Info").writeAll(circleCrawer.getInfo())
+        handler("Circle_Schedule").writeAll(circleCrawer.getSchedule())
+    for product in main.toIds([Int64(500000)]):
+        productCrawer = cppProductCrawer(product, context=context)
+        handler("Products_Info1").writeAll(productCrawer.getInfo())
+        handler("Product_Schedule1").writeAll(productCrawer.getSchedule())
+    cppDataHandler.closeAll()
+
+    conn = sqlite3.connect("9001.db")
+    try:
+        circles = conn.execute('SELECT COUNT(*) FROM "9001_Circle_Schedule" s '
+                               'JOIN "9001_Circles_Info" c ON s."circleId" = c."id"').fetchone()[0]
+        products = conn.execute('SELECT COUNT(*) FROM "9001_Product_Schedule1" s '
+                                'JOIN "9001_Products_Info1" p ON s."doujinshiId" = p."id"').fetchone()[0]
+        lookup = conn.execute('SELECT COUNT(*) FROM "9001_Circle_Schedule" WHERE "circleId" = 10000').fetchone()[0]
+    finally:
+        conn.close()
+    assert circles == 2
+    assert products == 4
+    assert lookup == 2
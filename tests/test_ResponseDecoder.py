@@ -0,0 +1,18 @@
+from types import SimpleNamespace
+
+from util.ResponseDecoder import isSuccessful
+
+
+def response(status, content, url="https://www.allcpp.cn/x"):
+    return SimpleNamespace(status_code=status, content=content, url=url)
+
+
+def test_only_successful_bodies_are_reused():
+    assert isSuccessful(response(200, b'{"isSuccess": true, "result": []}'))
+    assert not isSuccessful(response(200, b'{"isSuccess": false, "message": "busy"}'))
+    assert not isSuccessful(response(200, b"<html>busy</html>"))
+    assert not isSuccessful(response(404, b'{"isSuccess": true}'))
+    assert not isSuccessful(None)
+    # the event page is html, it has no isSuccess flag
+    assert isSuccessful(response(200, b"<html><span data-id='1'></span></html>",
+                                 "https://www.allcpp.cn/allcpp/event/event.do?event=9001"))
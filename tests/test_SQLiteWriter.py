@@ -0,0 +1,24 @@
+import sqlite3
+
+from util.SQLiteWriter import SQLiteWriter
+
+
+def test_failed_op_is_rolled_back(tmp_path):
+    path = str(tmp_path / "test.db")
+    writer = SQLiteWriter(path)
+    writer.execute('CREATE TABLE "t" ("id" INTEGER PRIMARY KEY)')
+    since = writer.position()
+    # the duplicate stops this executemany halfway
+    writer.executemany('INSERT INTO "t" VALUES (?)', [(1,), (2,), (2,), (3,)])
+    writer.callIfClean(since, lambda conn: conn.execute('INSERT INTO "t" VALUES (10)'),
+                       lambda conn: conn.execute('INSERT INTO "t" VALUES (20)'))
+    writer.callIfClean(writer.position(), lambda conn: conn.execute('INSERT INTO "t" VALUES (30)'),
+                       lambda conn: conn.execute('INSERT INTO "t" VALUES (40)'))
+    writer.close()
+
+    conn = sqlite3.connect(path)
+    try:
+        ids = [row[0] for row in conn.execute('SELECT "id" FROM "t" ORDER BY "id"')]
+    finally:
+        conn.close()
+    assert ids == [20, 30]
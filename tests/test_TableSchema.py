@@ -0,0 +1,32 @@
+import sqlite3
+
+from cppDataHandler import cppDataHandler
+from util.TableSchema import TableSchema, inferType
+
+from fakeApi import Int64
+
+
+def test_integer_scalars_stay_integer(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert inferType(Int64(10000)) == "INTEGER"
+    assert inferType(True) == "INTEGER"
+    assert inferType(1.5) == "REAL"
+    assert inferType("00123") == "TEXT"
+
+    handler = cppDataHandler(path="9001_Circle_Schedule", db_id="9001", force=True, keys=("circleId", "eventId"))
+    handler.writeAll([{"circleId": Int64(10000), "eventId": 9001}])
+    rows = handler.query('SELECT typeof("circleId"), "circleId" FROM "9001_Circle_Schedule"')
+    cppDataHandler.closeAll()
+    assert rows == [("integer", 10000)]
+
+
+def test_widening_to_text_keeps_values():
+    schema = TableSchema("t")
+    conn = sqlite3.connect(":memory:")
+    assert schema.observe([{"id": 1}])
+    schema.migrate(conn, dict(schema.columns))
+    conn.execute('INSERT INTO "t" ("id") VALUES (1)')
+    assert schema.observe([{"id": "00123"}])
+    schema.migrate(conn, dict(schema.columns))
+    conn.execute('INSERT INTO "t" ("id") VALUES (?)', ("00123",))
+    assert [row[0] for row in conn.execute('SELECT "id" FROM "t" ORDER BY rowid')] == ["1", "00123"]
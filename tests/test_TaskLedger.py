@@ -0,0 +1,7 @@
+from util.TaskLedger import TaskLedger
+
+
+def test_digest_ignores_the_sub_event():
+    circle = {"id": 10000, "name": "circle", "eventId": 9001}
+    assert TaskLedger.digest(dict(circle, dataId=1)) == TaskLedger.digest(dict(circle, dataId=2))
+    assert TaskLedger.digest(dict(circle, dataId=1)) != TaskLedger.digest(dict(circle, name="renamed", dataId=1))
@@ -1,16 +1,13 @@
 from cppDataHandler import cppDataHandler
 from cppEventCrawer import cppEventCrawer
-from util.KVDatabase import KVDatabase
 from util.CppRequest import CppRequest
+from util.CrawlContext import CrawlContext
 
 import os
 import sys 
 import concurrent.futures
-import pandas as pd
 import argparse
-import numpy as np
 from threading import Lock, Event   
-from tqdm import tqdm 
 from loguru import logger
 from datetime import datetime
 import copy
@@ -67,16 +64,10 @@ def main():
                         default=5,
                         help="max time to wait for a request. <= 0 for no timeout")
     args = parser.parse_args()
-    # get cookie config
-    config_path = os.path.join(os.path.dirname(os.path.realpath(sys.executable)), "config.json")
-    configDB = KVDatabase(config_path)
-
-    if not configDB.contains("cookie_path"):
-        configDB.insert("cookie_path", os.path.join(os.path.dirname(os.path.realpath(sys.executable)), "cookies.json"))
-    
-    cookie_path = configDB.get("cookie_path")
-
-    main_request = CppRequest(cookies_config_path=cookie_path)
+    # config, cookies and request client shared by every crawler of this run
+    context = CrawlContext.default()
+    configDB = context.configDB
+    main_request = context.main_request
 
     if args.refresh_cookie:
         global_cookieManager = main_request.cookieManager
@@ -99,7 +90,11 @@ def main():
     configDB.insert("maxRatePerMinute", args.maxRatePerMinute)
     configDB.insert("retryInterval", args.retryInterval)
     configDB.insert("maxWaitTime", args.maxWaitTime)
+    CppRequest.configureRetry(args.maxRetry, args.retryInterval, args.maxWaitTime)
+    CppRequest.configureRateLimit(args.maxRatePerMinute)
 
+    import pandas as pd
+    from tqdm import tqdm
     output = args.output
     userInfo = args.userSchedule
     productInfo = args.productSchedule
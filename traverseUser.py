@@ -1,16 +1,14 @@
 from cppDataHandler import cppDataHandler
 from cppUserCrawer import cppUserCrawer
-from util.KVDatabase import KVDatabase
 from util.CppRequest import CppRequest
+from util.CrawlContext import CrawlContext
 
 import os
 import sys 
 import concurrent.futures
-import pandas as pd
 import argparse
-import numpy as np
+import random
 from threading import Lock, Event   
-from tqdm import tqdm 
 from loguru import logger
 def isValidUID(uid):
     try:
@@ -53,16 +51,10 @@ def main():
                         default=10,
                         help="max time to wait for a request. <= 0 for no timeout")
     args = parser.parse_args()
-    # get cookie config
-    config_path = os.path.join(os.path.dirname(os.path.realpath(sys.executable)), "config.json")
-    configDB = KVDatabase(config_path)
-
-    if not configDB.contains("cookie_path"):
-        configDB.insert("cookie_path", os.path.join(os.path.dirname(os.path.realpath(sys.executable)), "cookies.json"))
-    
-    cookie_path = configDB.get("cookie_path")
-
-    main_request = CppRequest(cookies_config_path=cookie_path)
+    # config, cookies and request client shared by every crawler of this run
+    context = CrawlContext.default()
+    configDB = context.configDB
+    main_request = context.main_request
 
     if args.refresh_cookie:
         global_cookieManager = main_request.cookieManager
@@ -85,7 +77,11 @@ def main():
     configDB.insert("maxRatePerMinute", args.maxRatePerMinute)
     configDB.insert("retryInterval", args.retryInterval)
     configDB.insert("maxWaitTime", args.maxWaitTime)
+    CppRequest.configureRetry(args.maxRetry, args.retryInterval, args.maxWaitTime)
+    CppRequest.configureRateLimit(args.maxRatePerMinute)
 
+    import pandas as pd
+    from tqdm import tqdm
     number = args.number
     output = args.output
     userInfo = args.userInfo
@@ -124,7 +120,7 @@ def main():
         maxWorkers = number if number < 20 else 20
         while count < number:
             with concurrent.futures.ThreadPoolExecutor(max_workers=maxWorkers) as executor:
-                futures = {executor.submit(parallelCheck, np.random.randint(1, maxUID * 2)): i for i in range(number*2)}
+                futures = {executor.submit(parallelCheck, random.randint(1, maxUID * 2 - 1)): i for i in range(number*2)}
                 for _ in concurrent.futures.as_completed(futures):
                     if count >= number:
                         stopEvent.set()
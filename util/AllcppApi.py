@@ -0,0 +1,153 @@
+from datetime import datetime
+
+from util.ResponseDecoder import decodeJson
+from util.error import CrawlError
+
+# urls, form data and record shapes of the allcpp api, shared by the
+# threaded crawler classes and their async counterparts in cppAsyncCrawer
+
+EVENT_INFO_API = "https://www.allcpp.cn/allcpp/event/getevents.do"
+CIRCLE_LIST_API = "https://www.allcpp.cn/api/circle/getcirclelist.do"
+PRODUCT_LIST_API = "https://www.allcpp.cn/allcpp/event/getDoujinshiList.do"
+FORM_CONTENT_TYPE = "application/x-www-form-urlencoded; charset=UTF-8"
+# listing pages, a shorter page is not the last one, only an empty page is
+LIST_PAGE_SIZE = 50
+
+# (isnew, iswannago) lists of a user schedule, isnew lists of a product schedule
+USER_SCHEDULE_LISTS = [(1, 1), (0, 1), (1, 0), (0, 0)]
+PRODUCT_SCHEDULE_LISTS = [0, 1]
+
+
+def getResult(response, what):
+    # "result" of a successful api response, CrawlError for anything else
+    if response is None or response.status_code != 200:
+        raise CrawlError(f"{what} request failed")
+    try:
+        data = decodeJson(response)
+    except ValueError as e:
+        raise CrawlError(f"bad {what} response") from e
+    if not data["isSuccess"]:
+        raise CrawlError(f"bad {what} response")
+    return data["result"]
+
+
+def eventPageUrl(eventID):
+    return f'https://www.allcpp.cn/allcpp/event/event.do?event={eventID}'
+
+
+def parseDataIds(html):
+    # sub-event ids are the data-id spans of the event page, bs4 is only needed here
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, 'html.parser')
+    return [span['data-id'] for span in soup.find_all('span', attrs={'data-id': True})]
+
+
+def circleListForm(dataId, pageIndex):
+    return {'eventid': dataId,
+            'search': '',
+            'orderbyid': 0,
+            'typeid': '',
+            'pageindex': pageIndex,
+            'pagesize': LIST_PAGE_SIZE}
+
+
+def productListForm(dataId, pageIndex):
+    return {"eventid": dataId,
+            "searchstring": "",
+            "orderbyid": 3,
+            "typeid": "",
+            "pageindex": pageIndex,
+            "pagesize": LIST_PAGE_SIZE,
+            "sellstatus": "",
+            "sectionid": ""}
+
+
+def listedEntry(entry, eventID, dataId):
+    # circle or product of the event listing, tagged with its event
+    entry["eventId"] = eventID
+    entry["dataId"] = dataId
+    return entry
+
+
+def circleInfoUrl(circleID, myUID):
+    return f"https://www.allcpp.cn/api/circle/getcircledetail.do?circleid={circleID}&userid={myUID}"
+
+
+def circleScheduleUrl(circleID):
+    return f"https://www.allcpp.cn/allcpp/circle/mainEvent.do?circle_id={circleID}&startDate=2010-02-01"
+
+
+def circleEvent(circleID, event):
+    return {"circleId": circleID,
+            "eventId": event["id"],
+            "eventName": event["name"],
+            "enterTime": datetime.fromtimestamp(event["enterTime"] / 1000).strftime('%Y-%m-%d')}
+
+
+def circleProductsUrl(circleID, pageIndex):
+    return ''.join(["https://www.allcpp.cn/allcpp/circle/allBenZi.do?circle_id=",
+                    str(circleID),
+                    "&sub_event_id=0&page=",
+                    str(pageIndex),
+                    "&pageSize=600"])
+
+
+def productInfoUrl(PID):
+    return f"https://www.allcpp.cn/allcpp/djs/detail.do?doujinshiID={PID}"
+
+
+def productScheduleUrl(PID, isnew):
+    return "".join(["https://www.allcpp.cn/allcpp/djs/joinedEvent.do?doujinshiid=",
+                    str(PID),
+                    "&isnew=",
+                    str(isnew)])
+
+
+def productEvent(PID, isnew, event):
+    event["isnew"] = isnew
+    event["doujinshiId"] = PID
+    return event
+
+
+def userInfoUrl(UID):
+    return f"https://www.allcpp.cn/allcpp/loginregister/getUser/{UID}.do?"
+
+
+def isInvalidUser(data):
+    # deleted or hidden users come back with an empty nickname
+    return data["userMain"]["nickname"] == ""
+
+
+def userInfo(data):
+    # user's information, paticipated circleIds compressed to circleList
+    info = data["userMain"].copy()
+    info["circleList"] = [circle["circleId"] for circle in data["circleList"]]
+    return info
+
+
+def userProductsUrl(UID, pageIndex):
+    return "".join(["https://www.allcpp.cn/allcpp/doujinshi/getAuthorDoujinshiList.do",
+                    "?pageindex=",
+                    str(pageIndex),
+                    "&pagesize=2000&userid=",
+                    str(UID),
+                    "&searchstring=&canupdate=-1&havecreater=1"])
+
+
+def userScheduleUrl(UID, pageIndex, isnew, iswannago):
+    return "".join(["https://www.allcpp.cn/allcpp/user/getUserEventList.do?userid=",
+                    str(UID),
+                    "&pageindex=",
+                    str(pageIndex),
+                    "&pagesize=20&isnew=",
+                    str(isnew),
+                    "&iswannago=",
+                    str(iswannago)])
+
+
+def userEvent(UID, isnew, iswannago, event):
+    return {"uid": UID,
+            "isNew": isnew,
+            "isWannaGo": iswannago,
+            "eventId": event["id"],
+            "eventMainId": event["eventMainId"]}
@@ -0,0 +1,8 @@
+import os
+import sys
+
+
+def getBaseDir():
+    # directory holding config.json and cookies.json, next to the executable
+    # unless CPP_BASE_DIR points somewhere else (used by the benchmarks)
+    return os.environ.get("CPP_BASE_DIR") or os.path.dirname(os.path.realpath(sys.executable))
@@ -0,0 +1,146 @@
+import asyncio
+import time
+from loguru import logger
+
+from util.CookieManager import CookieManager
+from util.CppRequest import CppRequest
+from util.Endpoint import getEndpoint, rewriteUrl
+from util.ResponseDecoder import decodeJson
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+class AsyncHTTPError(Exception):
+    def __init__(self, response):
+        super().__init__(f"{response.status_code} Error for url: {response.url}")
+        self.response = response
+
+
+class AsyncResponse:
+    # the subset of requests.Response the crawlers use, body is read eagerly
+    def __init__(self, status_code, content, headers, url):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers
+        self.url = url
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return decodeJson(self)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise AsyncHTTPError(self)
+
+
+class AsyncCppRequest:
+    # asyncio counterpart of CppRequest. retry, timeout and rate-limit settings
+    # and the rate limiter itself are shared with the threaded client
+    def __init__(self, headers=None, cookies_config_path="", concurrency=100):
+        if aiohttp is None:
+            raise ImportError("aiohttp is required for the async crawling engine")
+        CppRequest.loadConfig()
+        self.cookieManager = CookieManager(cookies_config_path)
+        self.headers = headers or CppRequest.defaultHeaders.copy()
+        self.concurrency = concurrency
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.session = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def open(self):
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=self.concurrency)
+            self.session = aiohttp.ClientSession(connector=connector)
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def _checkRequestRate(self, url):
+        waitTime = CppRequest.rateLimiter.reserve(url)
+        CppRequest.metrics.observeRateWait(getEndpoint(url), waitTime)
+        if waitTime > 0:
+            await asyncio.sleep(waitTime)
+
+    async def _requestSingle(self, method, url, data=None, headers=None):
+        breaker = CppRequest.circuitBreakers.get(getEndpoint(url))
+        waitTime = breaker.waitTime()
+        if waitTime > 0:
+            logger.warning(f"Circuit open for {getEndpoint(url)}, waiting {waitTime:.1f} seconds")
+            await asyncio.sleep(waitTime)
+            CppRequest.metrics.observeBreakerWait(getEndpoint(url), waitTime)
+        await self._checkRequestRate(url)
+        if not headers:
+            headers = self.headers.copy()
+        headers["cookie"] = self.cookieManager.get_cookies_str()
+        timeout = aiohttp.ClientTimeout(total=CppRequest.maxWaitTime) if CppRequest.maxWaitTime > 0 else None
+        response = None
+        try:
+            async with self.semaphore:
+                start = time.perf_counter()
+                try:
+                    async with self.session.request(method, rewriteUrl(url, CppRequest.apiHost), data=data, headers=headers, timeout=timeout) as resp:
+                        content = await resp.read()
+                        response = AsyncResponse(resp.status, content, resp.headers, str(resp.url))
+                finally:
+                    CppRequest.metrics.observeRequest(getEndpoint(url),
+                                                      response.status_code if response is not None else None,
+                                                      time.perf_counter() - start,
+                                                      len(response.content) if response is not None else 0)
+            response.raise_for_status()
+        except Exception as e:
+            if CppRequest.retryPolicy.isOverload(e) and breaker.recordFailure():
+                logger.warning(f"Server overloaded on {getEndpoint(url)}, pausing it for {breaker.cooldown} seconds")
+            raise
+        breaker.recordSuccess()
+        return response
+
+    async def _requestWithRetry(self, method, url, data=None, headers=None):
+        retryPolicy = CppRequest.retryPolicy
+        for i in range(CppRequest.maxRetry):
+            try:
+                return await self._requestSingle(method, url, data, headers)
+            except Exception as e:
+                if not retryPolicy.isRetryable(e):
+                    logger.error(f"Request failed for {e}, not retrying")
+                    return getattr(e, "response", None)
+                if i + 1 >= CppRequest.maxRetry:
+                    logger.error(f"Request failed for {e}, {i+1}/{CppRequest.maxRetry}")
+                    break
+                waitTime = retryPolicy.backoff(i, e)
+                logger.error(f"Request failed for {e}, retrying {i+1}/{CppRequest.maxRetry} in {waitTime:.1f} seconds")
+                CppRequest.metrics.observeRetry(getEndpoint(url), waitTime)
+                if waitTime > 0:
+                    await asyncio.sleep(waitTime)
+        logger.error("Request failed after retry")
+        return None
+
+    async def request(self, method, url, data=None, headers=None):
+        await self.open()
+        if CppRequest.maxRetry <= 0:
+            return await self._requestSingle(method, url, data, headers)
+        else:
+            return await self._requestWithRetry(method, url, data, headers)
+
+    async def get(self, url, data=None, headers=None):
+        return await self.request("GET", url, data, headers)
+
+    async def post(self, url, data=None, headers=None):
+        return await self.request("POST", url, data, headers)
+
+    def getHeaders(self):
+        # a copy, callers add their own content-type
+        return self.headers.copy()
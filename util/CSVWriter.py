@@ -0,0 +1,68 @@
+import csv
+import os
+
+
+class CSVWriter:
+    # streaming csv output on one open file handle. the column set grows as
+    # new keys show up: the file is rewritten once with the wider header and
+    # earlier rows get empty cells. values are formatted like pandas' to_csv
+    # (str() of lists/dicts, empty for None) so existing readers keep working
+    def __init__(self, path, columns=None, append=False):
+        self.path = path
+        self.columns = []
+        self.file = None
+        self.writer = None
+        self.started = False
+        if append and os.path.exists(path) and os.path.getsize(path) > 0:
+            # keep the existing header order, declared columns go after it
+            with open(path, "r", newline="", encoding="utf-8") as f:
+                self.columns = next(csv.reader(f), [])
+            self.started = True
+        if self._extend(columns or []):
+            self._rewriteHeader()
+
+    def _open(self, mode):
+        self.file = open(self.path, mode, newline="", encoding="utf-8")
+        self.writer = csv.writer(self.file)
+
+    def _extend(self, keys):
+        # add unseen keys in first-seen order, True if the header changed
+        known = set(self.columns)
+        added = [key for key in dict.fromkeys(keys) if key not in known]
+        self.columns.extend(added)
+        return bool(added)
+
+    def _rewriteHeader(self):
+        # copy the existing rows under the new header, then swap the file in
+        if self.file is not None:
+            self.file.close()
+        tmpPath = self.path + ".tmp"
+        with open(tmpPath, "w", newline="", encoding="utf-8") as out:
+            writer = csv.writer(out)
+            writer.writerow(self.columns)
+            if self.started:
+                with open(self.path, "r", newline="", encoding="utf-8") as f:
+                    reader = csv.reader(f)
+                    next(reader, None)
+                    writer.writerows(reader)
+        os.replace(tmpPath, self.path)
+        self.started = True
+        self._open("a")
+
+    @staticmethod
+    def _format(value):
+        return "" if value is None else value
+
+    def writeRows(self, rows):
+        if self._extend(key for row in rows for key in row) or not self.started:
+            self._rewriteHeader()
+        elif self.file is None:
+            self._open("a")
+        columns = self.columns
+        self.writer.writerows([[self._format(row.get(col)) for col in columns] for row in rows])
+        self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
@@ -1,3 +1,6 @@
+import os
+import threading
+
 import requests
 from loguru import logger
 
@@ -5,9 +8,24 @@ from util.KVDatabase import KVDatabase
 
 
 class CookieManager:
+    # cookie header per cookie file, shared by all instances: path -> (mtime, header)
+    cookieHeaderCache = {}
+    cookieHeaderLock = threading.Lock()
+
     def __init__(self, config_file_path):
+        self.config_file_path = config_file_path
         self.db = KVDatabase(config_file_path)
 
+    def _cookie_file_mtime(self):
+        try:
+            return os.stat(self.config_file_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def invalidate_cookies_cache(self):
+        with self.cookieHeaderLock:
+            self.cookieHeaderCache.pop(self.config_file_path, None)
+
     @logger.catch
     def _login_and_save_cookies(
             self, login_url="https://cp.allcpp.cn/#/login/main"
@@ -42,6 +60,7 @@ class CookieManager:
                 self.db.insert("cookie", cookies_dict)
                 self.db.insert("password", password)
                 self.db.insert("phone", phone)
+                self.invalidate_cookies_cache()
 
                 return response.cookies
             else:
@@ -75,6 +94,7 @@ class CookieManager:
             cookies_dict = response.cookies.get_dict()
             logger.info(f"cookies: {cookies_dict}")
             self.db.insert("cookie", cookies_dict)
+            self.invalidate_cookies_cache()
             return cookies_dict
 
     def get_cookies(self, force=False):
@@ -89,10 +109,16 @@ class CookieManager:
         return self.db.contains("cookie") and self.db.contains("password") and self.db.contains("phone")
 
     def get_cookies_str(self):
-        cookies = self.get_cookies()
-        cookies_str = ""
-        for key in cookies.keys():
-            cookies_str += key + "=" + cookies[key] + "; "
+        # built once and kept in memory until the cookie file changes
+        mtime = self._cookie_file_mtime()
+        cached = self.cookieHeaderCache.get(self.config_file_path)
+        if cached is not None and mtime is not None and cached[0] == mtime:
+            return cached[1]
+        with self.cookieHeaderLock:
+            cookies = self.get_cookies()
+            cookies_str = "".join(key + "=" + cookies[key] + "; " for key in cookies.keys())
+            # re-stat, a first login inside get_cookies() writes the file
+            self.cookieHeaderCache[self.config_file_path] = (self._cookie_file_mtime(), cookies_str)
         return cookies_str
 
     def get_cookies_value(self, name):
@@ -119,5 +145,6 @@ class CookieManager:
         self.db.delete("cookie")
         self.db.delete("password")
         self.db.delete("phone")
+        self.invalidate_cookies_cache()
         self._login_and_save_cookies()
         return
\ No newline at end of file
@@ -1,80 +1,187 @@
-import requests
 import time
-import threading
 import os
-import sys
 from loguru import logger
-from collections import deque
 
 from util.CookieManager import CookieManager
 from util.KVDatabase import KVDatabase
+from util.RateLimiter import RateLimiter
+from util.RetryPolicy import RetryPolicy, CircuitBreakers
+from util.Endpoint import getEndpoint, rewriteUrl
+from util.ResponseDecoder import decodeJson, isSuccessful
+from util.ResponseCache import ResponseCache
+from util.SingleFlight import SingleFlight
+from util.RequestMetrics import RequestMetrics
+from util.SessionPool import SessionPool
+from util.AppPath import getBaseDir
 
 class CppRequest:
-    config_path = os.path.join(os.path.dirname(os.path.realpath(sys.executable)), "config.json")
-    configDB = KVDatabase(config_path)
-    global_request_queue = deque() 
-    global_queue_lock = threading.Lock() 
-    global_condition = threading.Condition(global_queue_lock)  # 条件变量
-    maxRetry = configDB.get("maxRetry") if configDB.contains("maxRetry") else 3
-    maxRatePerMinute = configDB.get("maxRatePerMinute") if configDB.contains("maxRatePerMinute") else 60
-    retryInterval = configDB.get("retryInterval") if configDB.contains("retryInterval") else 20
-    maxWaitTime = configDB.get("maxWaitTime") if configDB.contains("maxWaitTime") else 10
+    # defaults, overridden from config.json by loadConfig() on first use so
+    # that importing this module does no file I/O
+    configLoaded = False
+    maxRetry = 3
+    maxRatePerMinute = 60
+    retryInterval = 20
+    maxWaitTime = 10
+    # alternative host for www.allcpp.cn, CPP_API_HOST wins over the config
+    apiHost = ""
+    # per-endpoint budgets, e.g. {"productDetail": 60, "userInfo": 30}, see util.Endpoint
+    endpointRatePerMinute = {}
+    rateLimiter = RateLimiter(maxRatePerMinute, endpointRatePerMinute)
+    # retryInterval caps the exponential backoff that starts at retryBaseInterval
+    retryBaseInterval = 1
+    retryPolicy = RetryPolicy(retryBaseInterval, retryInterval)
+    breakerThreshold = 5
+    breakerCooldown = 60
+    circuitBreakers = CircuitBreakers(breakerThreshold, breakerCooldown)
+    # optional on-disk response cache, see configureCache
+    responseCache = None
+    # identical concurrent requests share one call, recent results are reused.
+    # singleFlightBytes caps the response bodies kept for reuse
+    singleFlightSize = 256
+    singleFlightMaxAge = 300
+    singleFlightBytes = 16 * 1024 * 1024
+    singleFlight = SingleFlight(singleFlightSize, singleFlightMaxAge, singleFlightBytes)
+    # per-endpoint counters and latency histograms, see RequestMetrics.startReporter
+    metrics = RequestMetrics()
+    defaultHeaders = {
+        'accept': 'application/json, text/plain, */*',
+        'accept-language': 'zh-CN,zh;q=0.9,en;q=0.8,en-GB;q=0.7,en-US;q=0.6,zh-TW;q=0.5,ja;q=0.4',
+        'cookie': "",
+        'origin': 'https://cp.allcpp.cn',
+        'priority': 'u=1, i',
+        'referer': 'https://cp.allcpp.cn/',
+        'sec-ch-ua': '"Not)A;Brand";v="99", "Microsoft Edge";v="127", "Chromium";v="127"',
+        'sec-ch-ua-mobile': '?0',
+        'sec-ch-ua-platform': '"Windows"',
+        'sec-fetch-dest': 'empty',
+        'sec-fetch-mode': 'cors',
+        'sec-fetch-site': 'same-site',
+        'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/127.0.0.0 Safari/537.36 Edg/127.0.0.0'
+    }
 
 
     def __init__(self, 
                 headers=None, 
-                cookies_config_path=""):    
-        self.session = requests.Session()
+                cookies_config_path="",
+                sessionPool=None):    
+        self.loadConfig()
+        # None means the process-wide pool, looked up per request so that
+        # SessionPool.configure() also applies to instances created earlier
+        self.sessionPool = sessionPool
         self.cookieManager = CookieManager(cookies_config_path)
-        self.headers = headers or {
-            'accept': 'application/json, text/plain, */*',
-            'accept-language': 'zh-CN,zh;q=0.9,en;q=0.8,en-GB;q=0.7,en-US;q=0.6,zh-TW;q=0.5,ja;q=0.4',
-            'cookie': "",
-            'origin': 'https://cp.allcpp.cn',
-            'priority': 'u=1, i',
-            'referer': 'https://cp.allcpp.cn/',
-            'sec-ch-ua': '"Not)A;Brand";v="99", "Microsoft Edge";v="127", "Chromium";v="127"',
-            'sec-ch-ua-mobile': '?0',
-            'sec-ch-ua-platform': '"Windows"',
-            'sec-fetch-dest': 'empty',
-            'sec-fetch-mode': 'cors',
-            'sec-fetch-site': 'same-site',
-            'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/127.0.0.0 Safari/537.36 Edg/127.0.0.0'
-        }
+        self.headers = headers or self.defaultHeaders.copy()
 
-    
-    def _checkRequestRate(self):
-        # check request rate, remove requests that are older than 60s
-        with self.global_queue_lock:
-            currentTime = time.time()
-            # if maxRatePerMinute <= 0, rate controll disabled, no need to check
-            if self.maxRatePerMinute <= 0:
-                return
-            while len(self.global_request_queue) > 0 and currentTime - self.global_request_queue[0] > 60:
-                self.global_request_queue.popleft()
-            
-            # if requestQueue is full, all threads should wait
-            if len(self.global_request_queue) >= self.maxRatePerMinute:
-                waitime = 60 - (currentTime - self.global_request_queue[0])
-                logger.warning(f"Request rate limit reached, waiting for {waitime} seconds")
-                self.global_condition.wait(waitime)
-                logger.warning("Request rate limit released")
-            # add current request time to queue
-            currentTime = time.time()
-            self.global_request_queue.append(currentTime)
+
+    @property
+    def session(self):
+        # thread-local session on top of the shared connection pool
+        return (self.sessionPool or SessionPool.shared()).getSession()
+
+    @classmethod
+    def loadConfig(cls, force=False):
+        # read request settings from config.json once per process
+        if cls.configLoaded and not force:
+            return
+        cls.configLoaded = True
+        configDB = KVDatabase(os.path.join(getBaseDir(), "config.json"))
+
+        def value(key, default):
+            return configDB.get(key) if configDB.contains(key) else default
+
+        cls.maxRetry = value("maxRetry", cls.maxRetry)
+        cls.maxRatePerMinute = value("maxRatePerMinute", cls.maxRatePerMinute)
+        cls.retryInterval = value("retryInterval", cls.retryInterval)
+        cls.maxWaitTime = value("maxWaitTime", cls.maxWaitTime)
+        cls.apiHost = os.environ.get("CPP_API_HOST") or value("apiHost", cls.apiHost) or ""
+        cls.endpointRatePerMinute = value("endpointRatePerMinute", cls.endpointRatePerMinute)
+        cls.rateLimiter.setRate(cls.maxRatePerMinute)
+        cls.rateLimiter.setEndpointRates(cls.endpointRatePerMinute)
+        cls.retryBaseInterval = value("retryBaseInterval", cls.retryBaseInterval)
+        cls.retryPolicy = RetryPolicy(cls.retryBaseInterval, cls.retryInterval)
+        cls.breakerThreshold = value("breakerThreshold", cls.breakerThreshold)
+        cls.breakerCooldown = value("breakerCooldown", cls.breakerCooldown)
+        cls.circuitBreakers = CircuitBreakers(cls.breakerThreshold, cls.breakerCooldown)
+        cls.singleFlightSize = value("singleFlightSize", cls.singleFlightSize)
+        cls.singleFlightMaxAge = value("singleFlightMaxAge", cls.singleFlightMaxAge)
+        cls.singleFlightBytes = value("singleFlightBytes", cls.singleFlightBytes)
+        cls.singleFlight = SingleFlight(cls.singleFlightSize, cls.singleFlightMaxAge, cls.singleFlightBytes)
+
+    @classmethod
+    def configureRateLimit(cls, maxRatePerMinute, endpointRatePerMinute=None):
+        # apply new budgets to the shared limiter
+        cls.loadConfig()
+        cls.maxRatePerMinute = maxRatePerMinute
+        cls.rateLimiter.setRate(maxRatePerMinute)
+        if endpointRatePerMinute is not None:
+            cls.endpointRatePerMinute = endpointRatePerMinute
+            cls.rateLimiter.setEndpointRates(endpointRatePerMinute)
+
+    @classmethod
+    def configureRetry(cls, maxRetry, retryInterval, maxWaitTime):
+        cls.loadConfig()
+        cls.maxRetry = maxRetry
+        cls.retryInterval = retryInterval
+        cls.maxWaitTime = maxWaitTime
+        cls.retryPolicy = RetryPolicy(cls.retryBaseInterval, retryInterval)
+
+    @classmethod
+    def configureCache(cls, path, ttl=None):
+        # empty path disables the cache
+        cls.loadConfig()
+        if cls.responseCache is not None:
+            cls.responseCache.close()
+        cls.responseCache = ResponseCache(path, ttl) if path else None
+        return cls.responseCache
+
+    def _checkCircuit(self, breaker, url):
+        # an open circuit pauses every thread hitting this endpoint
+        waitTime = breaker.waitTime()
+        if waitTime > 0:
+            logger.warning(f"Circuit open for {getEndpoint(url)}, waiting {waitTime:.1f} seconds")
+            time.sleep(waitTime)
+            self.metrics.observeBreakerWait(getEndpoint(url), waitTime)
+
+    def _recordResult(self, breaker, url, exc=None):
+        if exc is None:
+            breaker.recordSuccess()
+        elif self.retryPolicy.isOverload(exc) and breaker.recordFailure():
+            logger.warning(f"Server overloaded on {getEndpoint(url)}, pausing it for {breaker.cooldown} seconds")
+
+    def _checkRequestRate(self, url):
+        # reserve a token in the shared limiter, sleep outside of any lock
+        waitTime = self.rateLimiter.acquire(url)
+        self.metrics.observeRateWait(getEndpoint(url), waitTime)
+        if waitTime > 1:
+            logger.debug(f"Request rate limit reached, waited {waitTime:.2f} seconds")
         return
     
+    def _observe(self, url, response, start):
+        status = response.status_code if response is not None else None
+        size = len(response.content) if response is not None else 0
+        self.metrics.observeRequest(getEndpoint(url), status, time.perf_counter() - start, size)
+
     def _requestSingle(self, method, url, data=None, headers=None):
-        self._checkRequestRate()
+        breaker = self.circuitBreakers.get(getEndpoint(url))
+        self._checkCircuit(breaker, url)
+        self._checkRequestRate(url)
         if not headers:
             headers = self.headers.copy()
         headers["cookie"] = self.cookieManager.get_cookies_str()
         response = None
-        if self.maxWaitTime <= 0:
-            response = self.session.request(method, url, data=data, headers=headers)
-        else:
-            response = self.session.request(method, url, data=data, headers=headers, timeout=self.maxWaitTime)
-        response.raise_for_status()
+        requestUrl = rewriteUrl(url, self.apiHost)
+        start = time.perf_counter()
+        try:
+            if self.maxWaitTime <= 0:
+                response = self.session.request(method, requestUrl, data=data, headers=headers)
+            else:
+                response = self.session.request(method, requestUrl, data=data, headers=headers, timeout=self.maxWaitTime)
+            response.raise_for_status()
+        except Exception as e:
+            self._observe(url, response, start)
+            self._recordResult(breaker, url, e)
+            raise
+        self._observe(url, response, start)
+        self._recordResult(breaker, url)
         return response
     
     def _requestWithRetry(self, method, url, data=None, headers=None):
@@ -82,18 +189,56 @@ class CppRequest:
             try:
                 return self._requestSingle(method, url, data, headers)
             except Exception as e:
-                logger.error(f"Request failed for {e}, retrying {i+1}/{self.maxRetry}")
-                if self.retryInterval > 0:
-                    time.sleep(self.retryInterval)
+                if not self.retryPolicy.isRetryable(e):
+                    # e.g. 404 for a dead id, hand the response back to the caller
+                    logger.error(f"Request failed for {e}, not retrying")
+                    return getattr(e, "response", None)
+                if i + 1 >= self.maxRetry:
+                    logger.error(f"Request failed for {e}, {i+1}/{self.maxRetry}")
+                    break
+                waitTime = self.retryPolicy.backoff(i, e)
+                logger.error(f"Request failed for {e}, retrying {i+1}/{self.maxRetry} in {waitTime:.1f} seconds")
+                self.metrics.observeRetry(getEndpoint(url), waitTime)
+                if waitTime > 0:
+                    time.sleep(waitTime)
         logger.error("Request failed after retry")
         return None
     
-    def request(self, method, url, data=None, headers=None):
+    def _request(self, method, url, data=None, headers=None):
         if self.maxRetry <= 0:
             return self._requestSingle(method, url, data, headers)
         else:
             return self._requestWithRetry(method, url, data, headers)
 
+    def _requestCached(self, cache, method, url, data=None, headers=None):
+        key = cache.makeKey(method, url, data)
+        entry = cache.get(key)
+        if entry is not None and cache.isFresh(entry):
+            return cache.toResponse(entry)
+        if entry is not None and cache.validators(entry):
+            # stale with validators, ask the server whether it changed
+            headers = dict(headers or self.headers)
+            headers.update(cache.validators(entry))
+        response = self._request(method, url, data, headers)
+        if response is not None and response.status_code == 304 and entry is not None:
+            cache.touch(key)
+            return cache.toResponse(entry)
+        if isSuccessful(response):
+            cache.put(key, url, response)
+        return response
+
+    def _requestUncoalesced(self, method, url, data=None, headers=None):
+        cache = self.responseCache
+        if cache is not None and cache.getTTL(url) > 0:
+            return self._requestCached(cache, method, url, data, headers)
+        return self._request(method, url, data, headers)
+
+    def request(self, method, url, data=None, headers=None):
+        key = ResponseCache.makeKey(method, url, data)
+        return self.singleFlight.do(key,
+                                    lambda: self._requestUncoalesced(method, url, data, headers),
+                                    keep=isSuccessful, size=lambda response: len(response.content))
+
 
     def get(self, url, data=None, headers=None):
         return self.request("GET", url, data, headers)
@@ -105,7 +250,7 @@ class CppRequest:
         try:
             if not self.cookieManager.have_cookies():
                 return "未登录"
-            result = self.get("https://www.allcpp.cn/allcpp/circle/getCircleMannage.do").json()
+            result = decodeJson(self.get("https://www.allcpp.cn/allcpp/circle/getCircleMannage.do"))
             return result["result"]["joinCircleList"][0]["nickname"]
         except Exception as e:
             return "未登录"
@@ -114,7 +259,8 @@ class CppRequest:
         self.cookieManager.refreshToken()
     
     def getHeaders(self):
-        return self.headers
+        # a copy, the instance is shared by every crawler of a run and callers add their own content-type
+        return self.headers.copy()
 
 
 if __name__ == "__main__":
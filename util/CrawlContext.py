@@ -0,0 +1,43 @@
+import os
+import threading
+
+from util.AppPath import getBaseDir
+from util.CppRequest import CppRequest
+from util.KVDatabase import KVDatabase
+
+
+class CrawlContext:
+    # everything a crawler needs that is the same for the whole run: config,
+    # cookie path, the request client with its cookie manager, and our UID.
+    # build one per run and pass it to every crawler constructor; crawlers
+    # built without one share default(), so nothing is reloaded per entity
+    _default = None
+    _defaultLock = threading.Lock()
+
+    def __init__(self, config_path=None, sessionPool=None):
+        self.config_path = config_path or os.path.join(getBaseDir(), "config.json")
+        self.configDB = KVDatabase(self.config_path)
+        if not self.configDB.contains("cookie_path"):
+            self.configDB.insert("cookie_path", os.path.join(getBaseDir(), "cookies.json"))
+        self.cookie_path = self.configDB.get("cookie_path")
+
+        self.main_request = CppRequest(cookies_config_path=self.cookie_path, sessionPool=sessionPool)
+        self.cookieManager = self.main_request.cookieManager
+        self.UID = self.configDB.get("UID")
+
+    @classmethod
+    def default(cls):
+        # process-wide context for crawlers created without one
+        with cls._defaultLock:
+            if cls._default is None:
+                cls._default = cls()
+            return cls._default
+
+    @classmethod
+    def setDefault(cls, context):
+        with cls._defaultLock:
+            cls._default = context
+
+    def setUID(self, uid):
+        self.UID = uid
+        self.configDB.insert("UID", uid)
@@ -0,0 +1,146 @@
+import atexit
+import queue
+import threading
+import time
+from loguru import logger
+
+
+class DataSink:
+    # background output stage behind cppDataHandler. crawler threads hand
+    # over finished records without blocking; the sink thread coalesces them
+    # per handler and writes a batch once it reaches batchSize records or
+    # has waited flushInterval seconds
+    _shared = None
+    _sharedLock = threading.Lock()
+
+    def __init__(self, batchSize=1000, flushInterval=2.0):
+        self.batchSize = batchSize
+        self.flushInterval = flushInterval
+        self.queue = queue.Queue()
+        self.closed = False
+        # handler -> (first record time, records), only touched by the sink thread
+        self.buffers = {}
+        # (handlers still to write, callback) registered through after()
+        self.waiting = []
+        # items taken off the queue so far, and per handler the count at
+        # its last failed write
+        self.received = 0
+        self.failedAt = {}
+        self.thread = threading.Thread(target=self._run, name="DataSink", daemon=True)
+        self.thread.start()
+
+    @classmethod
+    def shared(cls):
+        with cls._sharedLock:
+            if cls._shared is None or cls._shared.closed:
+                cls._shared = cls()
+            return cls._shared
+
+    @classmethod
+    def closeShared(cls):
+        with cls._sharedLock:
+            sink, cls._shared = cls._shared, None
+        if sink is not None:
+            sink.close()
+
+    def put(self, handler, records):
+        if records:
+            self.queue.put((handler, records))
+
+    def position(self):
+        return self.received
+
+    def after(self, handlers, since, callback, onError):
+        # run callback on the sink thread once the records put so far for
+        # these handlers have been written, e.g. to mark a task done only
+        # after its output rows are queued for commit. if a write to one of
+        # them has failed since position() returned since, onError(error)
+        # runs instead
+        self.queue.put(("after", list(handlers), since, callback, onError))
+
+    def _call(self, callback, *args):
+        try:
+            callback(*args)
+        except Exception as e:
+            logger.error(f"Sink callback failed: {e}")
+
+    def flush(self):
+        # block until everything put so far has been handed to the handlers
+        done = threading.Event()
+        self.queue.put(("flush", done))
+        done.wait()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(None)
+        self.thread.join()
+
+    def _write(self, handler):
+        _, records = self.buffers.pop(handler)
+        try:
+            handler.writeBatch(records)
+        except Exception as e:
+            logger.error(f"Sink write to {handler.csvPath} failed: {e}")
+            self.failedAt[handler] = (self.received, e)
+        waiting, self.waiting = self.waiting, []
+        for remaining, item in waiting:
+            remaining.discard(handler)
+            if remaining:
+                self.waiting.append((remaining, item))
+            else:
+                self._done(item)
+
+    def _done(self, item):
+        _, handlers, since, callback, onError = item
+        for handler in handlers:
+            failedAt, error = self.failedAt.get(handler, (-1, None))
+            if failedAt > since:
+                self._call(onError, error)
+                return
+        self._call(callback)
+
+    def _flushAll(self):
+        for handler in list(self.buffers):
+            self._write(handler)
+
+    def _timeout(self):
+        # seconds until the oldest buffer is due
+        if not self.buffers:
+            return None
+        oldest = min(since for since, _ in self.buffers.values())
+        return max(0, oldest + self.flushInterval - time.monotonic())
+
+    def _run(self):
+        while True:
+            try:
+                item = self.queue.get(timeout=self._timeout())
+            except queue.Empty:
+                item = ()
+            if item is None:
+                self._flushAll()
+                return
+            if item and item[0] == "flush":
+                self._flushAll()
+                item[1].set()
+            elif item and item[0] == "after":
+                remaining = {handler for handler in item[1] if handler in self.buffers}
+                if remaining:
+                    self.waiting.append((remaining, item))
+                else:
+                    self._done(item)
+            elif item:
+                self.received += 1
+                handler, records = item
+                since, buffer = self.buffers.setdefault(handler, (time.monotonic(), []))
+                buffer.extend(records)
+                if len(buffer) >= self.batchSize:
+                    self._write(handler)
+            now = time.monotonic()
+            for handler, (since, _) in list(self.buffers.items()):
+                if now - since >= self.flushInterval:
+                    self._write(handler)
+
+
+atexit.register(DataSink.closeShared)
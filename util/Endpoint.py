@@ -0,0 +1,36 @@
+from urllib.parse import urlparse
+
+API_ORIGIN = "https://www.allcpp.cn"
+
+# endpoint name -> path fragment of the allcpp api, first match wins
+ENDPOINTS = [
+    ("eventInfo", "/allcpp/event/getevents.do"),
+    ("eventPage", "/allcpp/event/event.do"),
+    ("eventCircles", "/api/circle/getcirclelist.do"),
+    ("eventProducts", "/allcpp/event/getDoujinshiList.do"),
+    ("productDetail", "/allcpp/djs/detail.do"),
+    ("productSchedule", "/allcpp/djs/joinedEvent.do"),
+    ("circleDetail", "/api/circle/getcircledetail.do"),
+    ("circleSchedule", "/allcpp/circle/mainEvent.do"),
+    ("circleProducts", "/allcpp/circle/allBenZi.do"),
+    ("circleManage", "/allcpp/circle/getCircleMannage.do"),
+    ("userInfo", "/allcpp/loginregister/getUser/"),
+    ("userProducts", "/allcpp/doujinshi/getAuthorDoujinshiList.do"),
+    ("userSchedule", "/allcpp/user/getUserEventList.do"),
+]
+
+
+def getEndpoint(url):
+    # map a request url to its endpoint name, "other" if unknown
+    path = urlparse(url).path
+    for name, fragment in ENDPOINTS:
+        if fragment in path:
+            return name
+    return "other"
+
+
+def rewriteUrl(url, apiHost):
+    # send allcpp requests to another host, e.g. the benchmark mock server
+    if apiHost and url.startswith(API_ORIGIN):
+        return apiHost.rstrip("/") + url[len(API_ORIGIN):]
+    return url
@@ -0,0 +1,97 @@
+import threading
+import time
+from collections import deque
+
+from loguru import logger
+
+
+class FairScheduler:
+    # one worker pool shared by every crawl stage. each stage has its own
+    # queue, and an idle worker takes the next task from the backlogged
+    # stage that is furthest behind its weighted share of worker time, so no
+    # worker sits idle while any stage has work. every worker waits on the
+    # same CppRequest rate limiter, which makes worker time the request budget
+    def __init__(self, workers=40, weights=None, queueSize=None):
+        # weights: stage -> share, 1 for stages not listed. queueSize bounds
+        # every stage queue, a full queue blocks submit(), None for no bound
+        self.weights = dict(weights or {})
+        self.queueSize = queueSize
+        self.queues = {}
+        # virtual time per stage, the smallest backlogged one runs next
+        self.passes = {}
+        # moving average of the task duration per stage
+        self.costs = {}
+        self.clock = 0.0
+        self.pending = 0
+        self.closed = False
+        self.cond = threading.Condition()
+        self.threads = [threading.Thread(target=self._run, name=f"worker-{i}", daemon=True)
+                        for i in range(workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, stage, fn, *args, **kwargs):
+        with self.cond:
+            q = self.queues.setdefault(stage, deque())
+            while self.queueSize and len(q) >= self.queueSize and not self.closed:
+                self.cond.wait()
+            if self.closed:
+                raise RuntimeError("scheduler is closed")
+            if not q:
+                # a stage that was idle rejoins at the current clock, it banks no credit
+                self.passes[stage] = max(self.passes.get(stage, 0.0), self.clock)
+            q.append((fn, args, kwargs))
+            self.pending += 1
+            self.cond.notify_all()
+
+    def _next(self):
+        # pick a task, the lock is held
+        stages = [stage for stage, q in self.queues.items() if q]
+        if not stages:
+            return None
+        stage = min(stages, key=self.passes.get)
+        self.clock = self.passes[stage]
+        # charge the expected cost up front, so concurrent picks spread over the stages
+        self.passes[stage] += self.costs.get(stage, 1.0) / self.weights.get(stage, 1)
+        return stage, self.queues[stage].popleft()
+
+    def _run(self):
+        while True:
+            with self.cond:
+                picked = self._next()
+                while picked is None:
+                    if self.closed:
+                        return
+                    self.cond.wait()
+                    picked = self._next()
+                # a queue slot was freed
+                self.cond.notify_all()
+            stage, (fn, args, kwargs) = picked
+            start = time.monotonic()
+            try:
+                fn(*args, **kwargs)
+            except BaseException as e:
+                # a failing task, even a stray SystemExit or KeyboardInterrupt,
+                # must not take the worker down and leave join() waiting on it
+                logger.error(f"{stage} task failed: {e!r}")
+            finally:
+                elapsed = time.monotonic() - start
+                with self.cond:
+                    cost = self.costs.get(stage)
+                    self.costs[stage] = elapsed if cost is None else 0.8 * cost + 0.2 * elapsed
+                    self.pending -= 1
+                    self.cond.notify_all()
+
+    def join(self):
+        # wait for every task, including the ones submitted by running tasks
+        with self.cond:
+            while self.pending:
+                self.cond.wait()
+
+    def close(self):
+        self.join()
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        for thread in self.threads:
+            thread.join()
@@ -1,34 +1,120 @@
-from tinydb import TinyDB, Query
+import copy
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+
+@contextmanager
+def _fileLock(path):
+    # advisory lock on a side file, serializes writers across processes
+    with open(path + ".lock", "a+") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        elif msvcrt is not None:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            elif msvcrt is not None:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class _KVFile:
+    # in-memory state of one json file, shared by every KVDatabase on that path
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.RLock()
+        self.data = {}
+        self.mtime = None
+
+    def _stat(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def refresh(self):
+        # reload only when another process rewrote the file
+        mtime = self._stat()
+        if mtime == self.mtime:
+            return
+        data = {}
+        if mtime is not None:
+            with open(self.path, "r", encoding="utf-8") as f:
+                content = f.read()
+            # same layout as the TinyDB files written by earlier versions
+            table = json.loads(content).get("_default", {}) if content.strip() else {}
+            data = {doc["key"]: doc["value"] for doc in table.values() if "key" in doc}
+        self.data = data
+        self.mtime = mtime
+
+    def write(self):
+        table = {str(i + 1): {"key": key, "value": value} for i, (key, value) in enumerate(self.data.items())}
+        tmpPath = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmpPath, "w", encoding="utf-8") as f:
+            json.dump({"_default": table}, f, ensure_ascii=False)
+        os.replace(tmpPath, self.path)
+        self.mtime = self._stat()
 
 
 class KVDatabase:
+    _files = {}
+    _filesLock = threading.Lock()
+
     def __init__(self, db_path='kv_db.json'):
-        self.db = TinyDB(db_path)
-        self.KeyValue = Query()
+        path = os.path.abspath(db_path)
+        with self._filesLock:
+            self.file = self._files.get(path)
+            if self.file is None:
+                self.file = self._files[path] = _KVFile(path)
 
+    @contextmanager
+    def _writing(self):
+        # thread lock, then file lock, then pick up other processes' writes
+        with self.file.lock, _fileLock(self.file.path):
+            self.file.refresh()
+            yield self.file.data
+            self.file.write()
 
     def insert(self, key, value):
         # 如果键已经存在，更新其值；否则插入新键值对
-        if self.db.contains(self.KeyValue.key == key):
-            self.db.update({'value': value}, self.KeyValue.key == key)
-        else:
-            self.db.insert({'key': key, 'value': value})
+        with self._writing() as data:
+            data[key] = value
 
     def get(self, key):
-        result = self.db.get(self.KeyValue.key == key)
-        return result['value'] if result else None
+        with self.file.lock:
+            self.file.refresh()
+            value = self.file.data.get(key)
+        # callers may mutate what they get, keep the cache intact
+        return copy.deepcopy(value) if isinstance(value, (dict, list)) else value
 
     def update(self, key, value):
-        if self.db.contains(self.KeyValue.key == key):
-            self.db.update({'value': value}, self.KeyValue.key == key)
-        else:
-            raise KeyError(f"Key '{key}' not found in database.")
+        with self.file.lock:
+            self.file.refresh()
+            if key not in self.file.data:
+                raise KeyError(f"Key '{key}' not found in database.")
+            with self._writing() as data:
+                data[key] = value
 
     def delete(self, key):
-        self.db.remove(self.KeyValue.key == key)
+        with self._writing() as data:
+            data.pop(key, None)
 
     def contains(self, key):
-        return self.db.contains(self.KeyValue.key == key)
-
-
-
+        with self.file.lock:
+            self.file.refresh()
+            return key in self.file.data
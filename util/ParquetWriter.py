@@ -0,0 +1,132 @@
+import json
+import os
+
+from loguru import logger
+
+# pyarrow is imported by the first ParquetWriter, runs without --parquet never load it
+pa = None
+pq = None
+
+
+class ParquetWriter:
+    # columnar output for cppDataHandler. records are buffered into row
+    # groups of rowGroupSize rows; nested lists and dicts (circleMemberList,
+    # circleList, tags) are stored as native list/struct columns and every
+    # column is dictionary encoded, which covers the repeated tags, event and
+    # circle names. when a later row group brings a new column or a wider
+    # type, the file written so far is rewritten once under the wider schema
+    def __init__(self, path, rowGroupSize=50000, append=False):
+        global pa, pq
+        if pa is None:
+            try:
+                import pyarrow
+                import pyarrow.parquet
+            except ImportError:
+                raise ImportError("pyarrow is required for parquet output")
+            pa, pq = pyarrow, pyarrow.parquet
+        self.path = path
+        self.rowGroupSize = rowGroupSize
+        self.buffer = []
+        self.schema = None
+        self.writer = None
+        if append and os.path.exists(path):
+            # the first row group rewrites the existing rows, then appends
+            try:
+                self.schema = pq.read_schema(path)
+            except (pa.ArrowInvalid, OSError) as e:
+                # a crashed run never wrote the footer, its rows are still in the db
+                logger.warning(f"Parquet file {path} is unreadable ({e}), moved to {path}.corrupt")
+                os.replace(path, path + ".corrupt")
+
+    @staticmethod
+    def _toArray(values, type=None):
+        try:
+            array = pa.array(values, type=type)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            # mixed types in one column: fall back to text, json for nested values
+            if type is not None and not pa.types.is_string(type):
+                raise
+            array = pa.array([value if value is None or isinstance(value, str)
+                              else json.dumps(value, ensure_ascii=False) if isinstance(value, (list, dict))
+                              else str(value)
+                              for value in values], type=pa.string())
+        return array
+
+    @staticmethod
+    def _widen(old, new):
+        if old == new:
+            return old
+        try:
+            merged = pa.unify_schemas([pa.schema([("c", old)]), pa.schema([("c", new)])],
+                                      promote_options="permissive")
+            return merged.field("c").type
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError, TypeError):
+            return pa.string()
+
+    def _convert(self, values, type):
+        try:
+            return self._toArray(values, type)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            return self._toArray(values, pa.string())
+
+    def _open(self):
+        self.writer = pq.ParquetWriter(self.path, self.schema, use_dictionary=True, compression="zstd")
+
+    def _rewrite(self, schema):
+        # read back what is on disk and write it again under the new schema
+        if self.writer is not None:
+            self.writer.close()
+        old = pq.read_table(self.path)
+        self.schema = schema
+        self._open()
+        if old.num_rows:
+            self.writer.write_table(self._build({name: old.column(name).to_pylist() for name in old.column_names},
+                                                old.num_rows))
+
+    def _build(self, columns, numRows, arrays=None):
+        # one array per schema field, reusing already converted arrays
+        arrays = arrays or {}
+        built = []
+        for field in self.schema:
+            array = arrays.get(field.name)
+            if field.name not in columns:
+                array = pa.nulls(numRows, type=field.type)
+            elif array is None or array.type != field.type:
+                array = self._convert(columns[field.name], field.type)
+            built.append(array)
+        return pa.Table.from_arrays(built, schema=self.schema)
+
+    def _flushGroup(self):
+        rows, self.buffer = self.buffer, []
+        names = list(dict.fromkeys(key for row in rows for key in row))
+        columns = {name: [row.get(name) for row in rows] for name in names}
+        arrays = {name: self._toArray(values) for name, values in columns.items()}
+        types = {name: array.type for name, array in arrays.items()}
+
+        if self.schema is None:
+            self.schema = pa.schema([(name, types[name]) for name in names])
+            self._open()
+        else:
+            fields = []
+            for field in self.schema:
+                fields.append((field.name, self._widen(field.type, types[field.name]) if field.name in types else field.type))
+            known = set(self.schema.names)
+            fields.extend((name, types[name]) for name in names if name not in known)
+            schema = pa.schema(fields)
+            # also reopens a closed writer without losing its row groups
+            if not schema.equals(self.schema) or self.writer is None:
+                self._rewrite(schema)
+        self.writer.write_table(self._build(columns, len(rows), arrays))
+
+    def writeRows(self, rows):
+        self.buffer.extend(rows)
+        if len(self.buffer) >= self.rowGroupSize:
+            self._flushGroup()
+
+    def close(self):
+        # the footer is written on close, the file is unreadable without it
+        if self.buffer:
+            self._flushGroup()
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
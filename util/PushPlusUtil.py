@@ -2,7 +2,6 @@ import json
 
 import loguru
 import requests
-import playsound
 import os
 
 from config import get_application_tmp_path
@@ -29,4 +28,5 @@ def send_message(token, content, title):
 
 
 if __name__ == '__main__':
+    import playsound
     playsound.playsound(os.path.join(get_application_tmp_path(), "default.mp3"))
@@ -0,0 +1,64 @@
+import threading
+import time
+
+from util.Endpoint import getEndpoint
+
+
+class TokenBucket:
+    # token bucket with fractional refill. tokens may go negative: a caller
+    # reserves its slot under the lock and sleeps for the debt outside of it
+    def __init__(self, ratePerMinute, burst=None):
+        self.lock = threading.Lock()
+        self.setRate(ratePerMinute, burst)
+
+    def setRate(self, ratePerMinute, burst=None):
+        with self.lock:
+            self.ratePerMinute = ratePerMinute
+            self.rate = ratePerMinute / 60.0
+            # default burst is one second worth of requests, at least one
+            self.capacity = burst if burst is not None else max(1.0, self.rate)
+            self.tokens = self.capacity
+            self.last = time.monotonic()
+
+    def reserve(self):
+        # take one token, return the seconds to wait before using it
+        if self.ratePerMinute <= 0:
+            return 0.0
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+
+class RateLimiter:
+    # global budget plus optional per-endpoint budgets, see util.Endpoint
+    def __init__(self, maxRatePerMinute=60, endpointRatePerMinute=None):
+        self.globalBucket = TokenBucket(maxRatePerMinute)
+        self.endpointBuckets = {}
+        self.setEndpointRates(endpointRatePerMinute or {})
+
+    def setRate(self, maxRatePerMinute):
+        self.globalBucket.setRate(maxRatePerMinute)
+
+    def setEndpointRates(self, endpointRatePerMinute):
+        # buckets are replaced, not mutated, so reserve() needs no lock here
+        self.endpointBuckets = {name: TokenBucket(rate) for name, rate in endpointRatePerMinute.items()}
+
+    def reserve(self, url):
+        # reserve a slot in every matching bucket, return the longest wait
+        waitTime = self.globalBucket.reserve()
+        bucket = self.endpointBuckets.get(getEndpoint(url))
+        if bucket is not None:
+            waitTime = max(waitTime, bucket.reserve())
+        return waitTime
+
+    def acquire(self, url):
+        # block the calling thread only, no lock is held while sleeping
+        waitTime = self.reserve(url)
+        if waitTime > 0:
+            time.sleep(waitTime)
+        return waitTime
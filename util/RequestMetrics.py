@@ -0,0 +1,155 @@
+import atexit
+import json
+import os
+import threading
+import time
+from collections import Counter
+
+# upper bounds in seconds of the request latency histogram
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+
+
+class EndpointMetrics:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.bytesReceived = 0
+        self.statusCodes = Counter()
+        self.latencyBuckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latencySum = 0.0
+        self.rateWaitSeconds = 0.0
+        self.breakerWaitSeconds = 0.0
+        self.retrySleepSeconds = 0.0
+
+    def toDict(self):
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "retries": self.retries,
+            "bytesReceived": self.bytesReceived,
+            "statusCodes": {str(k): v for k, v in self.statusCodes.items()},
+            "latencyBuckets": dict(zip([str(b) for b in LATENCY_BUCKETS] + ["+Inf"], self.latencyBuckets)),
+            "latencySum": round(self.latencySum, 6),
+            "rateWaitSeconds": round(self.rateWaitSeconds, 6),
+            "breakerWaitSeconds": round(self.breakerWaitSeconds, 6),
+            "retrySleepSeconds": round(self.retrySleepSeconds, 6),
+        }
+
+
+class RequestMetrics:
+    # per-endpoint counters for CppRequest, endpoint names come from util.Endpoint
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = {}
+        self.startTime = time.time()
+        self.reporter = None
+        self.stopEvent = threading.Event()
+
+    def _get(self, endpoint):
+        metrics = self.endpoints.get(endpoint)
+        if metrics is None:
+            metrics = self.endpoints.setdefault(endpoint, EndpointMetrics())
+        return metrics
+
+    def observeRequest(self, endpoint, status, latency, size=0):
+        # status is None when no response came back (timeout, connection error)
+        with self.lock:
+            metrics = self._get(endpoint)
+            metrics.requests += 1
+            if status is None or status >= 400:
+                metrics.errors += 1
+            metrics.statusCodes[status if status is not None else "none"] += 1
+            metrics.bytesReceived += size
+            metrics.latencySum += latency
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if latency <= bound:
+                    metrics.latencyBuckets[i] += 1
+                    break
+            else:
+                metrics.latencyBuckets[-1] += 1
+
+    def observeRateWait(self, endpoint, seconds):
+        if seconds > 0:
+            with self.lock:
+                self._get(endpoint).rateWaitSeconds += seconds
+
+    def observeBreakerWait(self, endpoint, seconds):
+        if seconds > 0:
+            with self.lock:
+                self._get(endpoint).breakerWaitSeconds += seconds
+
+    def observeRetry(self, endpoint, sleepSeconds):
+        with self.lock:
+            metrics = self._get(endpoint)
+            metrics.retries += 1
+            metrics.retrySleepSeconds += sleepSeconds
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "timestamp": time.time(),
+                "uptime": round(time.time() - self.startTime, 3),
+                "endpoints": {name: metrics.toDict() for name, metrics in self.endpoints.items()},
+            }
+
+    def toPrometheus(self):
+        snapshot = self.snapshot()
+        lines = []
+
+        def metric(name, kind, helpText, samples, suffix=""):
+            lines.append(f"# HELP cpp_{name} {helpText}")
+            lines.append(f"# TYPE cpp_{name} {kind}")
+            for labels, value in samples:
+                labelText = ",".join(f'{k}="{v}"' for k, v in labels.items())
+                lines.append(f"cpp_{name}{suffix}{{{labelText}}} {value}")
+
+        endpoints = snapshot["endpoints"]
+        metric("requests_total", "counter", "HTTP requests sent",
+               [({"endpoint": e}, m["requests"]) for e, m in endpoints.items()])
+        metric("responses_total", "counter", "HTTP responses by status code",
+               [({"endpoint": e, "status": s}, n) for e, m in endpoints.items() for s, n in m["statusCodes"].items()])
+        metric("retries_total", "counter", "retried requests",
+               [({"endpoint": e}, m["retries"]) for e, m in endpoints.items()])
+        metric("received_bytes_total", "counter", "response body bytes",
+               [({"endpoint": e}, m["bytesReceived"]) for e, m in endpoints.items()])
+        for name, key, helpText in [("rate_wait_seconds_total", "rateWaitSeconds", "time blocked by the rate limiter"),
+                                    ("breaker_wait_seconds_total", "breakerWaitSeconds", "time blocked by an open circuit"),
+                                    ("retry_sleep_seconds_total", "retrySleepSeconds", "time slept before retries")]:
+            metric(name, "counter", helpText, [({"endpoint": e}, m[key]) for e, m in endpoints.items()])
+        samples = []
+        for e, m in endpoints.items():
+            cumulative = 0
+            for bound, count in m["latencyBuckets"].items():
+                cumulative += count
+                samples.append(({"endpoint": e, "le": bound}, cumulative))
+        metric("request_latency_seconds", "histogram", "request latency", samples, suffix="_bucket")
+        lines += [f'cpp_request_latency_seconds_sum{{endpoint="{e}"}} {m["latencySum"]}' for e, m in endpoints.items()]
+        lines += [f'cpp_request_latency_seconds_count{{endpoint="{e}"}} {m["requests"]}' for e, m in endpoints.items()]
+        return "\n".join(lines) + "\n"
+
+    def writeSnapshot(self, path):
+        # .json gets a json snapshot, anything else prometheus text format
+        if path.endswith(".json"):
+            content = json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+        else:
+            content = self.toPrometheus()
+        tmpPath = path + ".tmp"
+        with open(tmpPath, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(tmpPath, path)
+
+    def startReporter(self, path, interval=30):
+        # write a snapshot every interval seconds and once more at exit
+        def report():
+            while not self.stopEvent.wait(interval):
+                self.writeSnapshot(path)
+
+        self.stopEvent.clear()
+        self.reporter = threading.Thread(target=report, daemon=True)
+        self.reporter.start()
+        atexit.register(self.stopReporter, path)
+
+    def stopReporter(self, path):
+        self.stopEvent.set()
+        self.writeSnapshot(path)
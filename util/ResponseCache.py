@@ -0,0 +1,109 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from urllib.parse import urlencode
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from util.Endpoint import getEndpoint
+
+
+class ResponseCache:
+    # on-disk http cache for CppRequest, keyed by method + url + body.
+    # ttl is per endpoint in seconds, 0 means the endpoint is never cached
+    defaultTTL = {
+        "eventInfo": 24 * 3600,
+        "eventPage": 24 * 3600,
+        "eventCircles": 3600,
+        "eventProducts": 3600,
+        "productDetail": 24 * 3600,
+        "productSchedule": 24 * 3600,
+        "circleDetail": 24 * 3600,
+        "circleSchedule": 24 * 3600,
+        "circleProducts": 24 * 3600,
+        "userInfo": 24 * 3600,
+        "userProducts": 24 * 3600,
+        "userSchedule": 24 * 3600,
+        "circleManage": 0,
+        "other": 0,
+    }
+
+    def __init__(self, path="http_cache.db", ttl=None):
+        self.path = path
+        self.ttl = dict(self.defaultTTL)
+        self.ttl.update(ttl or {})
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute('CREATE TABLE IF NOT EXISTS "responses" ('
+                          '"key" TEXT PRIMARY KEY, "url" TEXT, "status" INTEGER, "headers" TEXT, '
+                          '"encoding" TEXT, "content" BLOB, "storedAt" REAL, "etag" TEXT, "lastModified" TEXT)')
+        self.conn.commit()
+
+    def getTTL(self, url):
+        return self.ttl.get(getEndpoint(url), 0)
+
+    @staticmethod
+    def makeKey(method, url, data=None):
+        if isinstance(data, dict):
+            body = urlencode(sorted(data.items()))
+        elif isinstance(data, bytes):
+            body = data.decode("utf-8", errors="replace")
+        else:
+            body = data or ""
+        return hashlib.sha1(f"{method.upper()}\n{url}\n{body}".encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        with self.lock:
+            row = self.conn.execute('SELECT "url", "status", "headers", "encoding", "content", "storedAt", "etag", "lastModified" '
+                                    'FROM "responses" WHERE "key" = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        names = ["url", "status", "headers", "encoding", "content", "storedAt", "etag", "lastModified"]
+        return dict(zip(names, row))
+
+    def isFresh(self, entry):
+        return time.time() - entry["storedAt"] < self.getTTL(entry["url"])
+
+    def put(self, key, url, response):
+        headers = dict(response.headers)
+        with self.lock:
+            self.conn.execute('INSERT OR REPLACE INTO "responses" VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                              (key, url, response.status_code, json.dumps(headers), response.encoding,
+                               response.content, time.time(), headers.get("ETag"), headers.get("Last-Modified")))
+            self.conn.commit()
+
+    def touch(self, key):
+        # a 304 revalidation restarts the ttl of the stored entry
+        with self.lock:
+            self.conn.execute('UPDATE "responses" SET "storedAt" = ? WHERE "key" = ?', (time.time(), key))
+            self.conn.commit()
+
+    @staticmethod
+    def validators(entry):
+        # conditional request headers for a stale entry, empty if the server sent none
+        headers = {}
+        if entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry["lastModified"]:
+            headers["If-Modified-Since"] = entry["lastModified"]
+        return headers
+
+    @staticmethod
+    def toResponse(entry):
+        response = requests.Response()
+        response.status_code = entry["status"]
+        response._content = entry["content"]
+        response.headers = CaseInsensitiveDict(json.loads(entry["headers"]))
+        response.encoding = entry["encoding"]
+        response.url = entry["url"]
+        response.from_cache = True
+        return response
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,41 @@
+import json
+import re
+
+from util.Endpoint import getEndpoint
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# endpoints serving html pages rather than json
+PAGE_ENDPOINTS = {"eventPage"}
+SUCCESS_FLAG = re.compile(rb'"isSuccess"\s*:\s*true')
+
+
+def loadsJson(content):
+    # orjson when installed, stdlib otherwise; both parse utf-8 bytes directly
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+def decodeJson(response):
+    # parse a response body straight from bytes, skipping charset detection.
+    # html error pages are rejected from the first bytes without parsing
+    content = response.content
+    if not content or content[:64].lstrip()[:1] not in (b"{", b"["):
+        raise ValueError(f"not a json response from {getattr(response, 'url', '')}")
+    return loadsJson(content)
+
+
+def isSuccessful(response):
+    # a 200 whose json body reports isSuccess, the only kind worth reusing;
+    # {"isSuccess": false} bodies are often temporary api errors. only looks
+    # for the flag in the raw bytes, the caller decodes the body anyway.
+    # html pages have no flag, any 200 page counts
+    if response is None or response.status_code != 200 or not response.content:
+        return False
+    if getEndpoint(getattr(response, "url", "")) in PAGE_ENDPOINTS:
+        return True
+    return SUCCESS_FLAG.search(response.content) is not None
@@ -0,0 +1,108 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+
+class RetryPolicy:
+    # classify failures and compute backoff. 4xx (except 408/429) are final,
+    # 429, 5xx, timeouts and connection errors back off exponentially with
+    # jitter, capped at maxInterval, and Retry-After wins when the server sends it
+    retryableStatus = {408, 429}
+
+    def __init__(self, baseInterval=1, maxInterval=30):
+        self.baseInterval = baseInterval
+        self.maxInterval = maxInterval
+
+    @staticmethod
+    def getStatus(exc):
+        response = getattr(exc, "response", None)
+        return getattr(response, "status_code", None)
+
+    def isRetryable(self, exc):
+        status = self.getStatus(exc)
+        if status is not None:
+            return status in self.retryableStatus or status >= 500
+        # json/value errors will not get better by asking again
+        return not isinstance(exc, ValueError)
+
+    def isOverload(self, exc):
+        # failures that mean the server is struggling, counted by the breaker
+        status = self.getStatus(exc)
+        if status is not None:
+            return status == 429 or status >= 500
+        return not isinstance(exc, ValueError)
+
+    @staticmethod
+    def getRetryAfter(exc):
+        response = getattr(exc, "response", None)
+        headers = getattr(response, "headers", None) or {}
+        value = headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    def backoff(self, attempt, exc=None):
+        # seconds to wait before retry number attempt (0-based)
+        retryAfter = self.getRetryAfter(exc) if exc is not None else None
+        if retryAfter is not None:
+            return retryAfter
+        if self.maxInterval <= 0:
+            return 0.0
+        interval = min(self.maxInterval, self.baseInterval * (2 ** attempt))
+        # equal jitter: keep half, randomize the other half
+        return interval / 2 + random.uniform(0, interval / 2)
+
+
+class CircuitBreaker:
+    # per-endpoint breaker shared by all threads. after `threshold` consecutive
+    # overload failures the circuit opens and every caller pauses for `cooldown`
+    # seconds; the next failure after that re-opens it, a success closes it
+    def __init__(self, threshold=5, cooldown=60):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.openUntil = 0.0
+
+    def waitTime(self):
+        return max(0.0, self.openUntil - time.monotonic())
+
+    def recordSuccess(self):
+        if self.failures:
+            with self.lock:
+                self.failures = 0
+
+    def recordFailure(self):
+        # returns True if this failure opened the circuit
+        if self.threshold <= 0:
+            return False
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.threshold and self.waitTime() <= 0:
+                self.openUntil = time.monotonic() + self.cooldown
+                return True
+        return False
+
+
+class CircuitBreakers:
+    # endpoint name -> CircuitBreaker, see util.Endpoint
+    def __init__(self, threshold=5, cooldown=60):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.breakers = {}
+        self.lock = threading.Lock()
+
+    def get(self, endpoint):
+        breaker = self.breakers.get(endpoint)
+        if breaker is None:
+            with self.lock:
+                breaker = self.breakers.setdefault(endpoint, CircuitBreaker(self.threshold, self.cooldown))
+        return breaker
@@ -0,0 +1,152 @@
+import atexit
+import os
+import queue
+import sqlite3
+import threading
+from loguru import logger
+
+
+class SQLiteWriter:
+    # one long-lived connection and one writer thread per database file.
+    # every cppDataHandler writing to that file enqueues its statements here;
+    # the thread applies them in order and commits them in large transactions
+    _writers = {}
+    _writersLock = threading.Lock()
+
+    pragmas = [
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA temp_store=MEMORY",
+        "PRAGMA cache_size=-65536",
+        "PRAGMA busy_timeout=30000",
+    ]
+
+    def __init__(self, dbPath, batchSize=1000):
+        self.dbPath = dbPath
+        self.batchSize = batchSize
+        self.queue = queue.Queue()
+        self.closed = False
+        # number of ops queued so far, and the number of the last one that
+        # failed and was rolled back, see position() and callIfClean()
+        self.queued = 0
+        self.failedAt = 0
+        self.queuedLock = threading.Lock()
+        self.thread = threading.Thread(target=self._run, name=f"SQLiteWriter-{os.path.basename(dbPath)}", daemon=True)
+        self.thread.start()
+
+    @classmethod
+    def get(cls, dbPath, batchSize=1000):
+        path = os.path.abspath(dbPath)
+        with cls._writersLock:
+            writer = cls._writers.get(path)
+            if writer is None or writer.closed:
+                writer = cls._writers[path] = cls(path, batchSize)
+            return writer
+
+    @classmethod
+    def closeAll(cls):
+        with cls._writersLock:
+            writers = list(cls._writers.values())
+            cls._writers.clear()
+        for writer in writers:
+            writer.close()
+
+    def _put(self, kind, target, args):
+        with self.queuedLock:
+            self.queued += 1
+            self.queue.put((kind, target, args, self.queued))
+
+    def position(self):
+        return self.queued
+
+    def execute(self, sql, params=()):
+        self._put("execute", sql, params)
+
+    def executemany(self, sql, rows):
+        if rows:
+            self._put("executemany", sql, rows)
+
+    def call(self, fn):
+        # run fn(conn) on the writer thread, in order with the statements
+        self._put("call", fn, None)
+
+    def callIfClean(self, since, fn, otherwise):
+        # fn(conn) if no op queued after position() returned since has
+        # failed, otherwise(conn) if one has
+        self._put("guard", (fn, otherwise), since)
+
+    def flush(self):
+        # block until everything queued so far is committed
+        done = threading.Event()
+        self.queue.put(("flush", done, None))
+        done.wait()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(None)
+        self.thread.join()
+
+    def _apply(self, conn, op):
+        kind, target, args, seq = op
+        if not conn.in_transaction:
+            conn.execute("BEGIN")
+        # a failed op is undone as a whole, an executemany that stopped
+        # halfway leaves no rows behind in the commit
+        conn.execute("SAVEPOINT op")
+        try:
+            if kind == "execute":
+                conn.execute(target, args)
+                count = 1
+            elif kind == "executemany":
+                conn.executemany(target, args)
+                count = len(args)
+            elif kind == "call":
+                target(conn)
+                count = 1
+            else:
+                fn, otherwise = target
+                (otherwise if self.failedAt > args else fn)(conn)
+                count = 1
+        except Exception as e:
+            logger.error(f"DB write failed: {e}")
+            conn.execute("ROLLBACK TO op")
+            self.failedAt = seq
+            count = 0
+        conn.execute("RELEASE op")
+        return count
+
+    def _run(self):
+        conn = sqlite3.connect(self.dbPath)
+        for pragma in self.pragmas:
+            conn.execute(pragma)
+        running = True
+        while running:
+            op = self.queue.get()
+            pending = 0
+            waiting = []
+            # drain whatever else is queued into the same transaction
+            while True:
+                if op is None:
+                    running = False
+                    break
+                if op[0] == "flush":
+                    waiting.append(op[1])
+                else:
+                    pending += self._apply(conn, op)
+                if pending >= self.batchSize:
+                    break
+                try:
+                    op = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            conn.commit()
+            if pending:
+                logger.debug(f"Committed {pending} rows to {self.dbPath}")
+            for done in waiting:
+                done.set()
+        conn.close()
+
+
+atexit.register(SQLiteWriter.closeAll)
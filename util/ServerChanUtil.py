@@ -2,7 +2,6 @@ import json
 
 import loguru
 import requests
-import playsound
 import os
 
 from config import get_application_tmp_path
@@ -28,4 +27,5 @@ def send_message(token, desp, title):
 
 
 if __name__ == '__main__':
+    import playsound
     playsound.playsound(os.path.join(get_application_tmp_path(), "default.mp3"))
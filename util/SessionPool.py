@@ -0,0 +1,39 @@
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class SessionPool:
+    # one connection pool for the whole process. every thread gets its own
+    # requests.Session (cookie jars are not thread-safe), but all sessions
+    # mount the same HTTPAdapter, so keep-alive connections are shared
+    _shared = None
+    _sharedLock = threading.Lock()
+
+    def __init__(self, poolConnections=4, poolMaxsize=50):
+        self.adapter = HTTPAdapter(pool_connections=poolConnections, pool_maxsize=poolMaxsize)
+        self.local = threading.local()
+
+    @classmethod
+    def shared(cls):
+        with cls._sharedLock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    @classmethod
+    def configure(cls, poolConnections=4, poolMaxsize=50):
+        # size the shared pool, call before the first request is made
+        with cls._sharedLock:
+            cls._shared = cls(poolConnections, poolMaxsize)
+            return cls._shared
+
+    def getSession(self):
+        session = getattr(self.local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.mount("https://", self.adapter)
+            session.mount("http://", self.adapter)
+            self.local.session = session
+        return session
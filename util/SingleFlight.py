@@ -0,0 +1,71 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.exc = None
+
+
+class SingleFlight:
+    # concurrent calls with the same key share one in-flight call and its
+    # result; successful results stay in a bounded lru for maxAge seconds.
+    # the lru holds at most maxRecent results and, when do() is given their
+    # size, at most maxBytes in total
+    def __init__(self, maxRecent=256, maxAge=300, maxBytes=None):
+        self.maxRecent = maxRecent
+        self.maxAge = maxAge
+        self.maxBytes = maxBytes
+        self.lock = threading.Lock()
+        self.inflight = {}
+        self.recent = OrderedDict()
+        self.recentBytes = 0
+
+    def do(self, key, fn, keep=None, size=None):
+        # keep(result) decides whether a finished result goes into the lru,
+        # size(result) is its size in bytes
+        with self.lock:
+            recent = self.recent.get(key)
+            if recent is not None and time.monotonic() - recent[0] < self.maxAge:
+                self.recent.move_to_end(key)
+                return recent[1]
+            call = self.inflight.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self.inflight[key] = call
+
+        if not leader:
+            call.event.wait()
+            if call.exc is not None:
+                raise call.exc
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.exc = e
+            raise
+        finally:
+            with self.lock:
+                del self.inflight[key]
+                if call.exc is None and self.maxRecent > 0 and (keep is None or keep(call.result)):
+                    self._remember(key, call.result, size(call.result) if size is not None else 0)
+            call.event.set()
+        return call.result
+
+    def _remember(self, key, result, nbytes):
+        # the lock is held
+        if self.maxBytes is not None and nbytes > self.maxBytes:
+            return
+        old = self.recent.pop(key, None)
+        if old is not None:
+            self.recentBytes -= old[2]
+        self.recent[key] = (time.monotonic(), result, nbytes)
+        self.recentBytes += nbytes
+        while len(self.recent) > self.maxRecent or (self.maxBytes is not None and self.recentBytes > self.maxBytes):
+            _, (_, _, evicted) = self.recent.popitem(last=False)
+            self.recentBytes -= evicted
@@ -0,0 +1,122 @@
+import numbers
+
+from loguru import logger
+
+# INTEGER < REAL < TEXT, "" is a column that has only seen None so far
+TYPE_RANK = {"": 0, "INTEGER": 1, "REAL": 2, "TEXT": 3}
+
+
+def inferType(value):
+    if value is None:
+        return ""
+    # numbers.* also covers numpy scalars, e.g. ids taken from a DataFrame
+    if isinstance(value, numbers.Integral):
+        return "INTEGER"
+    if isinstance(value, numbers.Real):
+        return "REAL"
+    # str, and lists/dicts stored as json
+    return "TEXT"
+
+
+def widenType(old, new):
+    return old if TYPE_RANK[old] >= TYPE_RANK[new] else new
+
+
+class TableSchema:
+    # column registry of one output table. types are inferred from every row
+    # of every batch and only ever widen; the db table follows through
+    # migrate(), which runs on the SQLiteWriter thread. columns that have
+    # only seen None are created without a declared type, so they keep
+    # numbers numeric once values arrive
+    def __init__(self, name, foreignKey=None):
+        # foreignKey: (parent table, columns, parent columns)
+        self.name = name
+        self.foreignKey = foreignKey
+        self.columns = {}
+        self.insertCache = {}
+
+    def observe(self, rows):
+        # add a batch to the registry, True if the db table may need to follow
+        batch = {}
+        for row in rows:
+            for col, value in row.items():
+                valueType = inferType(value)
+                batch[col] = widenType(batch[col], valueType) if col in batch else valueType
+        changed = False
+        for col, colType in batch.items():
+            old = self.columns.get(col)
+            if old is None:
+                self.columns[col] = colType
+                changed = True
+            elif widenType(old, colType) != old:
+                self.columns[col] = widenType(old, colType)
+                # integer affinity turns numeric text into numbers, so only a
+                # numeric column that now holds text has to be rebuilt
+                changed = changed or self.columns[col] == "TEXT"
+        return changed
+
+    def declare(self, col):
+        # make sure a column exists even before any value was seen
+        self.columns.setdefault(col, "")
+
+    def _quote(self, name):
+        return '"' + name.replace('"', '""') + '"'
+
+    def _createSql(self, table, columns):
+        defs = [f'{self._quote(col)} {colType}'.rstrip() for col, colType in columns.items()]
+        if self.foreignKey:
+            parent, cols, parentCols = self.foreignKey
+            defs.append(f'FOREIGN KEY ({", ".join(map(self._quote, cols))}) '
+                        f'REFERENCES {self._quote(parent)} ({", ".join(map(self._quote, parentCols))})')
+        return f'CREATE TABLE {self._quote(table)} ({", ".join(defs)})'
+
+    def migrate(self, conn, columns):
+        # bring the db table up to a snapshot of the registry
+        table = self._quote(self.name)
+        existing = {row[1]: row[2].upper() for row in conn.execute(f'PRAGMA table_info({table})')}
+        if not existing:
+            conn.execute(self._createSql(self.name, columns))
+            return
+        for col, colType in columns.items():
+            if col not in existing:
+                conn.execute(f'ALTER TABLE {table} ADD COLUMN {self._quote(col)} {colType}'.rstrip())
+                existing[col] = colType
+                logger.info(f"Added column {col} to table {self.name}")
+        widened = [col for col, colType in columns.items()
+                   if colType == "TEXT" and existing[col] in ("INTEGER", "REAL")]
+        if widened:
+            for col in widened:
+                existing[col] = "TEXT"
+            self._rebuild(conn, existing)
+            logger.info(f"Rebuilt table {self.name} to widen {widened} to TEXT")
+
+    def _rebuild(self, conn, columns):
+        # sqlite cannot change a declared type: copy into a new table and swap
+        indexSql = [row[0] for row in conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type='index' AND tbl_name=? AND sql IS NOT NULL", (self.name,))]
+        tmpName = self.name + "__rebuild"
+        names = ', '.join(self._quote(col) for col in columns)
+        conn.execute(f'DROP TABLE IF EXISTS {self._quote(tmpName)}')
+        conn.execute(self._createSql(tmpName, columns))
+        conn.execute(f'INSERT INTO {self._quote(tmpName)} ({names}) SELECT {names} FROM {self._quote(self.name)}')
+        conn.execute(f'DROP TABLE {self._quote(self.name)}')
+        conn.execute(f'ALTER TABLE {self._quote(tmpName)} RENAME TO {self._quote(self.name)}')
+        for sql in indexSql:
+            conn.execute(sql)
+
+    def insertSql(self, columns, keys=()):
+        # one statement per column set, built once
+        cacheKey = tuple(columns)
+        sql = self.insertCache.get(cacheKey)
+        if sql is None:
+            names = ', '.join(self._quote(col) for col in columns)
+            placeholders = ', '.join(['?'] * len(columns))
+            sql = f'INSERT INTO {self._quote(self.name)} ({names}) VALUES ({placeholders})'
+            if keys:
+                # re-runs update the stored row instead of appending a duplicate
+                keyNames = ', '.join(self._quote(key) for key in keys)
+                updates = ', '.join(f'{self._quote(col)} = excluded.{self._quote(col)}'
+                                    for col in columns if col not in keys)
+                sql += f' ON CONFLICT ({keyNames}) ' + (f'DO UPDATE SET {updates}' if updates else 'DO NOTHING')
+            self.insertCache[cacheKey] = sql
+        return sql
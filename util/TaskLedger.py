@@ -0,0 +1,86 @@
+import hashlib
+import json
+import sqlite3
+import time
+
+from util.SQLiteWriter import SQLiteWriter
+
+
+class TaskLedger:
+    # per event record of every circle/product/user task and its status,
+    # kept in the event db. writes share the SQLiteWriter queue with the
+    # output rows, so a task marked done after its rows were queued is never
+    # committed without them. done tasks also keep a hash of the listing
+    # entry they came from, which lets an incremental run skip unchanged ones
+    PENDING = "pending"
+    DONE = "done"
+    FAILED = "failed"
+
+    def __init__(self, dbPath, table="tasks"):
+        self.dbPath = dbPath
+        self.table = table
+        self.writer.call(self._migrate)
+
+    @staticmethod
+    def digest(entry):
+        # stable hash of a listing entry, independent of key order. the
+        # sub-event tags are left out, an entity listed under several
+        # sub-events hashes the same under each of them
+        entry = {key: value for key, value in entry.items() if key not in ("eventId", "dataId")}
+        text = json.dumps(entry, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def _migrate(self, conn):
+        conn.execute(f'CREATE TABLE IF NOT EXISTS "{self.table}" '
+                     '("kind" TEXT, "entityId", "status" TEXT, "error" TEXT, "updatedAt" REAL, "hash" TEXT, '
+                     'PRIMARY KEY ("kind", "entityId"))')
+        # ledgers written before hashes were kept
+        columns = {row[1] for row in conn.execute(f'PRAGMA table_info("{self.table}")')}
+        if "hash" not in columns:
+            conn.execute(f'ALTER TABLE "{self.table}" ADD COLUMN "hash" TEXT')
+
+    @property
+    def writer(self):
+        return SQLiteWriter.get(self.dbPath)
+
+    def _markSql(self):
+        # a mark without a hash keeps the one stored before
+        return (f'INSERT INTO "{self.table}" ("kind", "entityId", "status", "error", "updatedAt", "hash") '
+                'VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT ("kind", "entityId") DO UPDATE SET '
+                '"status" = excluded."status", "error" = excluded."error", '
+                '"updatedAt" = excluded."updatedAt", "hash" = COALESCE(excluded."hash", "hash")')
+
+    def mark(self, kind, entityId, status, error=None, digest=None):
+        self.writer.execute(self._markSql(), (kind, entityId, status, error, time.time(), digest))
+
+    def markDone(self, kind, entityId, since, digest=None):
+        # done unless a write queued on the event db after position() gave
+        # since has failed, the task's rows may be among them. it is marked
+        # failed then and retried on resume
+        sql = self._markSql()
+        self.writer.callIfClean(
+            since,
+            lambda conn: conn.execute(sql, (kind, entityId, self.DONE, None, time.time(), digest)),
+            lambda conn: conn.execute(sql, (kind, entityId, self.FAILED, "rows were not written", time.time(), None)))
+
+    def statuses(self, kind):
+        # entityId -> status of every task of this kind committed so far
+        self.writer.flush()
+        conn = sqlite3.connect(self.dbPath)
+        try:
+            return dict(conn.execute(f'SELECT "entityId", "status" FROM "{self.table}" WHERE "kind" = ?', (kind,)))
+        finally:
+            conn.close()
+
+    def hashes(self, kind):
+        # entityId -> listing hash of every task of this kind that is done
+        self.writer.flush()
+        conn = sqlite3.connect(self.dbPath)
+        try:
+            return dict(conn.execute(f'SELECT "entityId", "hash" FROM "{self.table}" '
+                                     'WHERE "kind" = ? AND "status" = ?', (kind, self.DONE)))
+        finally:
+            conn.close()
+
+    def ids(self, kind, status):
+        return {entityId for entityId, current in self.statuses(kind).items() if current == status}
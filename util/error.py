@@ -8,3 +8,9 @@ ERRNO_DICT = {
 
 def withTimeString(string):
     return f"{datetime.datetime.now()}: {string}"
+
+
+class CrawlError(Exception):
+    # a page of an entity could not be fetched. raised instead of returning
+    # a partial result, so the caller can record the entity as failed
+    pass